@@ -0,0 +1,54 @@
+"""Compares the traci and libsumo backends of V2I on the bundled v2v scenario.
+
+Reports reset latency and steps per second of random-action episodes for
+each backend. Requires the `sumo` binary on PATH and, for libsumo, the
+libsumo python package.
+
+Usage: python benchmarks/bench_backends.py [--resets 20] [--steps 2000]
+"""
+import argparse
+import statistics
+import time
+
+from sumo.envs.v2i import V2I
+
+
+def measure(sumo_backend, resets, steps, seed):
+    env = V2I(sumo_backend=sumo_backend)
+    env.action_space.seed(seed)
+    # First reset starts SUMO, it is not part of the reset latency
+    env.reset(seed=seed)
+
+    reset_times = []
+    for episode in range(resets):
+        start = time.perf_counter()
+        env.reset(seed=seed + episode)
+        reset_times.append(time.perf_counter() - start)
+
+    env.reset(seed=seed)
+    step_time = 0.0
+    for _ in range(steps):
+        start = time.perf_counter()
+        _, _, terminated, truncated, _ = env.step(env.action_space.sample()[0])
+        step_time += time.perf_counter() - start
+        if terminated or truncated:
+            env.reset()
+    env.close()
+    return statistics.mean(reset_times), statistics.median(reset_times), steps / step_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resets", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("{:>8} {:>16} {:>18} {:>12}".format("backend", "reset mean (ms)", "reset median (ms)", "steps/sec"))
+    for sumo_backend in ("traci", "libsumo"):
+        mean, median, sps = measure(sumo_backend, args.resets, args.steps, args.seed)
+        print("{:>8} {:>16.2f} {:>18.2f} {:>12.1f}".format(sumo_backend, mean * 1e3, median * 1e3, sps))
+
+
+if __name__ == "__main__":
+    main()
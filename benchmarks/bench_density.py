@@ -0,0 +1,86 @@
+"""Traffic density benchmark of V2I.
+
+Runs V2I with TrafficGenerator fleets of growing size, departing as a
+Poisson process within about --depart-window seconds with a mix of
+vTypes, and reports the time to generate and write the scenario, the
+reset time, steps per second and the mean number of vehicles running per
+step. All routes enter the net on one lane, so insertion caps the number
+of vehicles running at once and the rest of the fleet waits in SUMO's
+insertion queue. The ego vehicle departs early
+(--ego-index) so that warm-up does not grow with the fleet. Requires the
+`sumo` binary on PATH.
+
+Usage: python benchmarks/bench_density.py [--vehicles 50,500,1000,5000] [--steps 500]
+       [--depart-window 60] [--ego-index 10]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from sumo.envs.traffic import TrafficGenerator
+from sumo.envs.v2i import V2I
+
+VTYPES = [{"id": "car", "weight": 0.8, "length": 5, "maxSpeed": 50, "accel": 2.6, "decel": 4.5,
+           "minGap": 1, "color": "yellow"},
+          {"id": "truck", "weight": 0.2, "length": 12, "maxSpeed": 25, "accel": 1.3, "decel": 4,
+           "minGap": 2.5, "color": "blue"}]
+
+
+def measure(num_vehicles, steps, depart_window, ego_index, obs_backend, seed):
+    traffic = TrafficGenerator(num_vehicles=num_vehicles,
+                               ego_index=min(ego_index, num_vehicles - 1),
+                               depart_rate=num_vehicles / depart_window,
+                               route_mix={"r_0": 0.5, "r_1": 0.5},
+                               vtypes=VTYPES)
+    env = V2I(obs_backend=obs_backend, traffic=traffic, profile=True)
+    try:
+        start = time.perf_counter()
+        env.reset(seed=seed)
+        reset_time = time.perf_counter() - start
+
+        running = []
+        done = 0
+        start = time.perf_counter()
+        for _ in range(steps):
+            _, _, terminated, truncated, _ = env.step(0.0)
+            done += 1
+            running.append(env._tc.vehicle.getIDCount())
+            if terminated or truncated:
+                break
+        elapsed = time.perf_counter() - start
+
+        phases = env.profile_summary()["phases"]
+        scenario = sum(phases.get(name, {}).get("total", 0.0)
+                       for name in ("reset.scenario.xml_build", "reset.scenario.file_write"))
+    finally:
+        env.close()
+    return {"scenario": scenario, "reset": reset_time, "steps": done,
+            "steps_per_sec": done / elapsed, "running": float(np.mean(running))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vehicles", default="50,500,1000,5000")
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--depart-window", type=float, default=60.0)
+    parser.add_argument("--ego-index", type=int, default=10)
+    parser.add_argument("--obs-backend", default="grid", choices=V2I.obs_backends)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("{:>9} {:>14} {:>11} {:>7} {:>11} {:>9}".format("vehicles", "scenario (ms)", "reset (ms)",
+                                                          "steps", "steps/sec", "running"))
+    for num_vehicles in [int(n) for n in args.vehicles.split(",")]:
+        result = measure(num_vehicles, args.steps, args.depart_window, args.ego_index,
+                         args.obs_backend, args.seed)
+        print("{:>9} {:>14.1f} {:>11.1f} {:>7} {:>11.1f} {:>9.1f}".format(num_vehicles,
+                                                                          result["scenario"] * 1e3,
+                                                                          result["reset"] * 1e3,
+                                                                          result["steps"],
+                                                                          result["steps_per_sec"],
+                                                                          result["running"]))
+
+
+if __name__ == "__main__":
+    main()
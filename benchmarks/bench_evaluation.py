@@ -0,0 +1,56 @@
+"""Parallel evaluation benchmark of EvaluationRunner.
+
+Evaluates a simple speed keeping policy on sumo/v2i-v0 over a list of
+seeds with growing numbers of workers, and reports episodes per second
+and whether the aggregate returns, lengths and collision rates equal the
+ones of a single worker. Requires the `sumo` binary on PATH.
+
+Usage: python benchmarks/bench_evaluation.py [--seeds 16] [--workers 1,2,4]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from sumo.envs.evaluation import EvaluationRunner
+
+
+class SpeedKeeping:
+    """Accelerates ego towards a target speed. The nearest vehicle of the
+    observation is ego itself, its speed is the third value."""
+
+    def __init__(self, target_speed: float=10.0):
+        self._target_speed = target_speed
+
+    def __call__(self, obs):
+        return np.float32(np.clip(self._target_speed - obs[2], -2, 2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seeds", type=int, default=16)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--target-speed", type=float, default=10.0)
+    args = parser.parse_args()
+
+    seeds = list(range(args.seeds))
+    reference = None
+    print("{:>8} {:>13} {:>12} {:>12} {:>10} {:>10}".format("workers", "episodes/sec", "return mean",
+                                                            "return ci95", "collided", "identical"))
+    for num_workers in [int(n) for n in args.workers.split(",")]:
+        runner = EvaluationRunner(SpeedKeeping(args.target_speed), num_workers=num_workers)
+        start = time.perf_counter()
+        summary = runner.evaluate(seeds)
+        elapsed = time.perf_counter() - start
+        # Step times are wall clock, everything else must match
+        summary.pop("step_time")
+        reference = summary if reference is None else reference
+        print("{:>8} {:>13.2f} {:>12.3f} {:>12.3f} {:>10.2f} {:>10}".format(num_workers, len(seeds) / elapsed,
+                                                                          summary["return"]["mean"],
+                                                                          summary["return"]["ci95"],
+                                                                          summary["collided"]["mean"],
+                                                                          str(summary == reference)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Lookahead benchmark of V2I.fork and V2I.restore.
+
+Runs an episode for a number of steps to a search node, then evaluates
+random action sequences (branches) from that node, once by replaying the
+episode from reset for every branch and once by restoring a checkpoint
+of the node, and reports branches per second, the time to get back to
+the node and whether both give the same branches. Each method then
+resets to a new episode, which must match the one of a fresh env.
+Requires the `sumo` binary on PATH.
+
+Usage: python benchmarks/bench_fork.py [--node-steps 100] [--branches 16] [--horizon 20]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from sumo.envs.v2i import V2I
+from sumo.envs.checkpoint import CheckpointCache
+
+
+def run(env, actions):
+    """Returns (obs, reward) of every step until the episode ends."""
+    trace = []
+    for action in actions:
+        obs, reward, terminated, truncated, _ = env.step(float(action))
+        trace.append((obs, reward))
+        if terminated or truncated:
+            break
+    return trace
+
+
+def same_trace(a, b):
+    return len(a) == len(b) and all(np.array_equal(x[0], y[0]) and x[1] == y[1] for x, y in zip(a, b))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--node-steps", type=int, default=100)
+    parser.add_argument("--branches", type=int, default=16)
+    parser.add_argument("--horizon", type=int, default=20)
+    parser.add_argument("--obs-backend", default="grid", choices=V2I.obs_backends)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    prefix = rng.uniform(-2, 2, size=args.node_steps)
+    branches = rng.uniform(-2, 2, size=(args.branches, args.horizon))
+
+    # Episode of the next seed in a fresh env, compared with the one each
+    # method resets to after its branches
+    env = V2I(obs_backend=args.obs_backend, label="bench")
+    try:
+        env.reset(seed=args.seed + 1)
+        next_episode = run(env, prefix)
+    finally:
+        env.close()
+
+    print("{:>22} {:>13} {:>15} {:>12} {:>12}".format("method", "branches/sec", "to node (ms)", "identical",
+                                                       "next reset"))
+    reference = None
+    methods = [("reset+replay", None),
+               ("restore tmpfs", dict(storage="tmpfs")),
+               ("restore memory gzip", dict(storage="memory", compress=True))]
+    for name, cache_kwargs in methods:
+        checkpoints = CheckpointCache(**cache_kwargs) if cache_kwargs is not None else None
+        env = V2I(obs_backend=args.obs_backend, checkpoints=checkpoints, label="bench")
+        try:
+            if checkpoints is not None:
+                env.reset(seed=args.seed)
+                run(env, prefix)
+                node = env.fork()
+            traces = []
+            to_node = 0.0
+            start = time.perf_counter()
+            for actions in branches:
+                begin = time.perf_counter()
+                if checkpoints is None:
+                    env.reset(seed=args.seed)
+                    run(env, prefix)
+                else:
+                    env.restore(node)
+                to_node += time.perf_counter() - begin
+                traces.append(run(env, actions))
+            elapsed = time.perf_counter() - start
+            env.reset(seed=args.seed + 1)
+            after = run(env, prefix)
+        finally:
+            env.close()
+            if checkpoints is not None:
+                checkpoints.close()
+
+        reference = traces if reference is None else reference
+        same = all(same_trace(a, b) for a, b in zip(traces, reference))
+        print("{:>22} {:>13.1f} {:>15.2f} {:>12} {:>12}".format(name, len(branches) / elapsed,
+                                                                to_node / len(branches) * 1e3, str(same),
+                                                                str(same_trace(after, next_episode))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Microbenchmark of the V2I observation builder.
+
+Compares the per-call cost of the NumPy observation builder against the
+previous dict/namedtuple based implementation of `V2I._get_obs`. Vehicle
+data is served from memory, so no SUMO process is needed and only the
+Python side of the observation is measured.
+
+Usage: python benchmarks/bench_obs.py [--repeats 2000]
+"""
+import argparse
+import timeit
+from collections import namedtuple
+
+import numpy as np
+from scipy.spatial import distance
+
+from sumo.envs.v2i import V2I
+
+Vehicle = namedtuple("Vehicle", ["id", "x", "y", "speed"])
+
+
+class _FakeVehicleDomain:
+    def __init__(self, ids, positions, speeds):
+        self._ids = tuple(ids)
+        self._positions = {vid: tuple(p) for vid, p in zip(ids, positions.tolist())}
+        self._speeds = dict(zip(ids, speeds.tolist()))
+
+    def getIDList(self):
+        return self._ids
+
+    def getPosition(self, vehID):
+        return self._positions[vehID]
+
+    def getSpeed(self, vehID):
+        return self._speeds[vehID]
+
+
+class _FakeTraCI:
+    def __init__(self, vehicle):
+        self.vehicle = vehicle
+
+
+def legacy_get_obs(tc, view_size, max_nearby_vehicles):
+    """The observation builder as it was before the NumPy path."""
+    veh_ids = list(tc.vehicle.getIDList())
+    veh_positions = {}
+    ref_pos_ego = tc.vehicle.getPosition("ego")
+    for veh_id in veh_ids:
+        pos = tc.vehicle.getPosition(veh_id)
+        dist = distance.euclidean(ref_pos_ego, pos)
+        if dist <= view_size:
+            trans_pos = pos[0] - ref_pos_ego[0], pos[1] - ref_pos_ego[1]
+            veh_positions[veh_id] = Vehicle(id=veh_id,
+                                            x=trans_pos[0],
+                                            y=trans_pos[1],
+                                            speed=tc.vehicle.getSpeed(veh_id))
+    ego_veh = veh_positions['ego']
+    dist_dict = {}
+    for veh in veh_positions.values():
+        dist_dict[veh.id] = distance.euclidean((ego_veh.x, ego_veh.y), (veh.x, veh.y))
+    dist_dict = sorted(dist_dict.items(), key=lambda x: x[1])
+    obs = []
+    for idx, (vid, dist) in enumerate(dist_dict):
+        v = veh_positions[vid]
+        obs.append((v.x, v.y, v.speed))
+        if (idx + 1) >= max_nearby_vehicles:
+            break
+    remaining_obs = max_nearby_vehicles - len(obs)
+    if remaining_obs > 0:
+        obs = obs + [(-1, -1, -1)] * remaining_obs
+    return np.array(obs, dtype=np.float32).flatten(), len(veh_positions)
+
+
+def make_scene(num_vehicles, view_size, seed=0):
+    rng = np.random.default_rng(seed)
+    # Keep the density constant, roughly 10 vehicles within view of ego.
+    half_extent = view_size * np.sqrt(num_vehicles / 10.0) * np.sqrt(np.pi) / 2
+    positions = rng.uniform(-half_extent, half_extent, size=(num_vehicles, 2))
+    positions[0] = 0.0
+    speeds = rng.uniform(0, 30, size=num_vehicles)
+    ids = ["ego"] + ["car_" + str(i) for i in range(1, num_vehicles)]
+    return _FakeTraCI(_FakeVehicleDomain(ids, positions, speeds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=2000)
+    parser.add_argument("--view-size", type=int, default=20)
+    parser.add_argument("--max-nearby-vehicles", type=int, default=6)
+    args = parser.parse_args()
+
+    env = V2I(view_size=args.view_size, max_nearby_vehicles=args.max_nearby_vehicles)
+    print("{:>10} {:>14} {:>14} {:>8}".format("vehicles", "legacy (us)", "numpy (us)", "speedup"))
+    for num_vehicles in (10, 100, 1000):
+        tc = make_scene(num_vehicles, args.view_size)
+        expected = legacy_get_obs(tc, args.view_size, args.max_nearby_vehicles)
+        got = env._get_obs(tc)
+        assert expected[0].tobytes() == got[0].tobytes() and expected[1] == got[1]
+
+        legacy = min(timeit.repeat(lambda: legacy_get_obs(tc, args.view_size, args.max_nearby_vehicles),
+                                   number=args.repeats, repeat=3)) / args.repeats
+        vectorized = min(timeit.repeat(lambda: env._get_obs(tc),
+                                       number=args.repeats, repeat=3)) / args.repeats
+        print("{:>10} {:>14.1f} {:>14.1f} {:>7.1f}x".format(num_vehicles,
+                                                            legacy * 1e6,
+                                                            vectorized * 1e6,
+                                                            legacy / vectorized))
+
+
+if __name__ == "__main__":
+    main()
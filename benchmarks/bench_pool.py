@@ -0,0 +1,53 @@
+"""Short-lived env benchmark of SumoServerPool.
+
+Creates, resets, steps and closes a number of V2I envs one after the
+other, as hyperparameter sweeps do, once starting a SUMO server per env
+and once leasing warm servers from a SumoServerPool. Reports the time per
+env lifetime. Requires the `sumo` binary on PATH.
+
+Usage: python benchmarks/bench_pool.py [--envs 20] [--steps 10] [--pool-size 2]
+"""
+import argparse
+import statistics
+import time
+
+from sumo.envs.pool import SumoServerPool
+from sumo.envs.v2i import V2I
+
+
+def measure(num_envs, steps, seed, pool=None):
+    durations = []
+    for index in range(num_envs):
+        start = time.perf_counter()
+        env = V2I(server_pool=pool)
+        env.reset(seed=seed + index)
+        for _ in range(steps):
+            env.step(0.0)
+        env.close()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--envs", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("{:>10} {:>16} {:>16}".format("servers", "mean (ms/env)", "median (ms/env)"))
+    durations = measure(args.envs, args.steps, args.seed)
+    print("{:>10} {:>16.1f} {:>16.1f}".format("per env", statistics.mean(durations) * 1e3,
+                                              statistics.median(durations) * 1e3))
+
+    with SumoServerPool(size=args.pool_size) as pool:
+        # Servers are started up front, as a sweep would do once
+        pool.start()
+        durations = measure(args.envs, args.steps, args.seed, pool)
+    print("{:>10} {:>16.1f} {:>16.1f}".format("pooled", statistics.mean(durations) * 1e3,
+                                              statistics.median(durations) * 1e3))
+
+
+if __name__ == "__main__":
+    main()
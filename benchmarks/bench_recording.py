@@ -0,0 +1,83 @@
+"""Trajectory recording benchmark of V2I.
+
+Steps V2I with and without record_dir and reports steps/sec, the size of
+the recorded dataset per step and the latency of reading random episodes
+back with TrajectoryReader. Requires the `sumo` binary on PATH.
+
+Usage: python benchmarks/bench_recording.py [--episodes 5] [--reads 1000] [--obs-backend grid]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from sumo.envs.recording import TrajectoryReader
+from sumo.envs.v2i import V2I
+
+
+def measure(episodes, seed, obs_backend, record_dir=None):
+    env = V2I(obs_backend=obs_backend, record_dir=record_dir, label="bench")
+    steps = 0
+    elapsed = 0.0
+    try:
+        for episode in range(episodes):
+            env.reset(seed=seed + episode)
+            rng = np.random.default_rng(seed + episode)
+            start = time.perf_counter()
+            while True:
+                _, _, terminated, truncated, _ = env.step(float(rng.uniform(-2, 2)))
+                steps += 1
+                if terminated or truncated:
+                    break
+            elapsed += time.perf_counter() - start
+    finally:
+        env.close()
+    return steps, elapsed
+
+
+def dataset_size(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--episodes", type=int, default=5)
+    parser.add_argument("--reads", type=int, default=1000)
+    parser.add_argument("--obs-backend", default="grid", choices=V2I.obs_backends)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    record_dir = tempfile.mkdtemp(prefix="v2i-bench-recording-")
+    try:
+        print("{:>10} {:>8} {:>11}".format("recording", "steps", "steps/sec"))
+        for record in (False, True):
+            steps, elapsed = measure(args.episodes, args.seed, args.obs_backend,
+                                     record_dir if record else None)
+            print("{:>10} {:>8} {:>11.1f}".format("on" if record else "off", steps, steps / elapsed))
+
+        path = os.path.join(record_dir, "bench")
+        reader = TrajectoryReader(path)
+        print("Dataset: {} episodes, {} rows, {:.1f} bytes/row".format(len(reader), reader.num_steps,
+                                                                       dataset_size(path) / reader.num_steps))
+
+        rng = np.random.default_rng(args.seed)
+        durations = []
+        for idx in rng.integers(0, len(reader), size=args.reads):
+            # A fresh reader per read, so chunks are mapped every time
+            start = time.perf_counter()
+            episode = TrajectoryReader(path).episode(int(idx))
+            np.asarray(episode["obs"]).sum()
+            durations.append(time.perf_counter() - start)
+        print("Random episode read: median {:.3f} ms, max {:.3f} ms".format(statistics.median(durations) * 1e3,
+                                                                            max(durations) * 1e3))
+    finally:
+        shutil.rmtree(record_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
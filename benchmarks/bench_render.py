@@ -0,0 +1,85 @@
+"""Rendering benchmark of the bird's-eye rasterizer.
+
+Reports frames per second of BirdsEyeRasterizer alone, with growing
+numbers of vehicles around ego on the lanes of the bundled net, and the
+steps/sec of V2I with vector observations, with image observations and
+with render_mode="rgb_array" and a render after every step. Only the env
+section requires the `sumo` binary on PATH.
+
+Usage: python benchmarks/bench_render.py [--image-size 84] [--meters-per-pixel 0.5] [--steps 300]
+"""
+import argparse
+import time
+import timeit
+
+import numpy as np
+
+from sumo.envs.v2i import V2I, _net_background, _net_lanes
+from sumo.envs.rendering import BirdsEyeRasterizer
+
+
+def run(env, steps, render):
+    """Returns steps/sec over steps steps, resetting as episodes end."""
+    env.reset(seed=0)
+    start = time.perf_counter()
+    for _ in range(steps):
+        _, _, terminated, truncated, _ = env.step(0.5)
+        if render:
+            env.render()
+        if terminated or truncated:
+            env.reset()
+    return steps / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image-size", type=int, default=84)
+    parser.add_argument("--meters-per-pixel", type=float, default=0.5)
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--skip-env", action="store_true", help="Only benchmark the rasterizer.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    margin = args.image_size * args.meters_per_pixel
+    background, origin = _net_background(args.meters_per_pixel, margin)
+    print("Background raster {}x{} drawn in {:.1f} ms".format(background.shape[0], background.shape[1],
+                                                             (time.perf_counter() - start) * 1e3))
+    renderer = BirdsEyeRasterizer(background, origin, args.meters_per_pixel, size=args.image_size)
+
+    # Vehicles spread along the lanes, ego in the middle of the first one
+    rng = np.random.default_rng(0)
+    shapes, _ = _net_lanes()
+    lanes = [np.asarray(shape) for shape in shapes if len(shape) == 2]
+    print("{:>10} {:>12}".format("vehicles", "frames/sec"))
+    for num_vehicles in (1, 10, 50, 200):
+        picks = rng.integers(0, len(lanes), size=num_vehicles)
+        t = rng.uniform(0, 1, size=(num_vehicles, 1))
+        starts = np.array([lanes[idx][0] for idx in picks])
+        ends = np.array([lanes[idx][1] for idx in picks])
+        positions = starts + t * (ends - starts)
+        delta = ends - starts
+        angles = np.degrees(np.arctan2(delta[:, 0], delta[:, 1]))
+        positions[0] = (lanes[0][0] + lanes[0][1]) / 2
+
+        def render():
+            renderer.render(positions[0], positions, angles, ego_index=0)
+
+        elapsed = min(timeit.repeat(render, number=1000, repeat=3)) / 1000
+        print("{:>10} {:>12.0f}".format(num_vehicles, 1 / elapsed))
+
+    if args.skip_env:
+        return
+    print("{:>22} {:>11}".format("env", "steps/sec"))
+    configs = [("vector obs", dict(obs_backend="grid"), False),
+               ("image obs", dict(obs_mode="image"), False),
+               ("rgb_array render", dict(obs_backend="grid", render_mode="rgb_array"), True)]
+    for name, kwargs, render in configs:
+        env = V2I(image_size=args.image_size, meters_per_pixel=args.meters_per_pixel, label="bench", **kwargs)
+        try:
+            print("{:>22} {:>11.1f}".format(name, run(env, args.steps, render)))
+        finally:
+            env.close()
+
+
+if __name__ == "__main__":
+    main()
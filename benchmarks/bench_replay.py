@@ -0,0 +1,65 @@
+"""Replay backend benchmark of V2I.
+
+Records episodes with fixed seeds and actions through replay_dir, then
+steps the same episodes with sumo_backend="replay" and reports steps/sec
+of both, and whether the replayed observations and rewards match. Only
+recording requires the `sumo` binary on PATH.
+
+Usage: python benchmarks/bench_replay.py [--episodes 3] [--obs-backend grid]
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from sumo.envs.v2i import V2I
+
+
+def run(env, episodes, seed):
+    """Returns the steps, seconds spent stepping and (obs, reward) per step."""
+    trace = []
+    elapsed = 0.0
+    for episode in range(episodes):
+        obs, _ = env.reset(seed=seed + episode)
+        trace.append((obs, 0.0))
+        rng = np.random.default_rng(seed + episode)
+        start = time.perf_counter()
+        while True:
+            obs, reward, terminated, truncated, _ = env.step(float(rng.uniform(-2, 2)))
+            trace.append((obs, reward))
+            if terminated or truncated:
+                break
+        elapsed += time.perf_counter() - start
+    return len(trace) - episodes, elapsed, trace
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--episodes", type=int, default=3)
+    parser.add_argument("--obs-backend", default="grid", choices=V2I.obs_backends)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    replay_dir = tempfile.mkdtemp(prefix="v2i-bench-replay-")
+    try:
+        print("{:>10} {:>8} {:>11}".format("backend", "steps", "steps/sec"))
+        traces = {}
+        for backend in ("traci", "replay"):
+            env = V2I(obs_backend=args.obs_backend, sumo_backend=backend, replay_dir=replay_dir, label="bench")
+            try:
+                steps, elapsed, traces[backend] = run(env, args.episodes, args.seed)
+            finally:
+                env.close()
+            print("{:>10} {:>8} {:>11.1f}".format(backend, steps, steps / elapsed))
+
+        same = all(np.array_equal(a[0], b[0]) and a[1] == b[1]
+                   for a, b in zip(traces["traci"], traces["replay"]))
+        print("Replay matches recording: {}".format(same))
+    finally:
+        shutil.rmtree(replay_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
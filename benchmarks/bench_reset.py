@@ -0,0 +1,145 @@
+"""Reset latency benchmark of V2I.
+
+Measures reset latency of every reset mode (and SUMO backend) over a
+number of seeded resets. The first reset, which starts SUMO and fills
+the scenario and snapshot caches, is excluded. Requires the `sumo`
+binary on PATH and, for libsumo, the libsumo python package.
+
+With --check, the initial state after every reset of each mode (running
+vehicles with lane, position, speed and speed factor, traffic light
+phases and time to switch, expected vehicle count and observation) is
+compared against a hard reset in load mode, and so is the trajectory that
+follows: observations and rewards of --horizon steps with the same
+actions. The number of matching steps is reported, soft resets do not
+reset SUMO's random number generators and are expected to diverge.
+Every seed is reset twice in a row, so that each new scenario is loaded
+right after a snapshot was restored.
+
+Usage: python benchmarks/bench_reset.py [--resets 50] [--backends traci,libsumo] [--check] [--horizon 50]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from sumo.envs.v2i import V2I
+
+
+def measure(reset_mode, sumo_backend, resets, seed):
+    env = V2I(reset_mode=reset_mode, sumo_backend=sumo_backend)
+    # Visit both route variants once, so that their caches are warm
+    env.reset(seed=seed)
+    env.reset(seed=seed + 1)
+
+    latencies = []
+    for episode in range(resets):
+        start = time.perf_counter()
+        env.reset(seed=seed + episode)
+        latencies.append(time.perf_counter() - start)
+    env.close()
+    return np.array(latencies) * 1e3
+
+
+def initial_state(env, seed):
+    obs, info = env.reset(seed=seed)
+    tc = env._tc
+    now = tc.simulation.getTime()
+    tls = [(tls_id, tc.trafficlight.getPhase(tls_id), tc.trafficlight.getNextSwitch(tls_id) - now)
+           for tls_id in env._get_tls_ids(tc)]
+    return (obs.tolist(), info["num_vehicles_nearby"],
+            tc.simulation.getMinExpectedNumber(), tls, env._get_fleet_state(tc, ())["running"])
+
+
+def same_state(a, b):
+    """Compares initial states, floats up to the precision of saved states."""
+    (obs_a, nearby_a, expected_a, tls_a, fleet_a), (obs_b, nearby_b, expected_b, tls_b, fleet_b) = a, b
+    if (obs_a, nearby_a, expected_a) != (obs_b, nearby_b, expected_b) or len(fleet_a) != len(fleet_b):
+        return False
+    for veh_a, veh_b in zip(tls_a + fleet_a, tls_b + fleet_b):
+        # Traffic lights hold two ids, vehicles four
+        ids = 2 if len(veh_a) == 3 else 4
+        if veh_a[:ids] != veh_b[:ids] or not np.allclose(veh_a[ids:], veh_b[ids:], rtol=0, atol=1e-12):
+            return False
+    return True
+
+
+def trajectory(env, actions):
+    """Returns (obs, reward) of every step until the episode ends."""
+    trace = []
+    for action in actions:
+        obs, reward, terminated, truncated, _ = env.step(float(action))
+        trace.append((obs, reward))
+        if terminated or truncated:
+            break
+    return trace
+
+
+def matching_steps(a, b):
+    """Number of steps before two trajectories first differ."""
+    for step, ((obs_a, reward_a), (obs_b, reward_b)) in enumerate(zip(a, b)):
+        if not np.array_equal(obs_a, obs_b) or reward_a != reward_b:
+            return step
+    return min(len(a), len(b))
+
+
+def check(reset_mode, sumo_backend, resets, seed, horizon):
+    """Returns the number of resets whose initial state differs from a
+    hard reset with the same seed, the number of trajectories that differ
+    and the mean number of matching steps."""
+    reference = V2I(reset_mode="load", label="reference")
+    env = V2I(reset_mode=reset_mode, sumo_backend=sumo_backend)
+    rng = np.random.default_rng(seed)
+    mismatches, diverged, matched = 0, 0, 0
+    for episode in range(resets):
+        # Seeds 0, 0, 1, 1, ...: the second reset of a seed restores its snapshot
+        expected = initial_state(reference, seed + episode // 2)
+        mismatches += not same_state(initial_state(env, seed + episode // 2), expected)
+        actions = rng.uniform(-2, 2, size=horizon)
+        expected_trace = trajectory(reference, actions)
+        trace = trajectory(env, actions)
+        steps = matching_steps(trace, expected_trace)
+        diverged += steps < max(len(trace), len(expected_trace))
+        matched += steps
+        # Leave the simulation in a different state than a fresh episode,
+        # every other episode is reset right away
+        for _ in range(20 * (episode % 2)):
+            _, _, terminated, truncated, _ = env.step(0.0)
+            if terminated or truncated:
+                break
+    env.close()
+    reference.close()
+    return mismatches, diverged, matched / resets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resets", type=int, default=50)
+    parser.add_argument("--backends", type=str, default="traci,libsumo")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--horizon", type=int, default=50, help="Steps of the trajectories compared by --check.")
+    args = parser.parse_args()
+
+    if args.check:
+        print("{:>8} {:>10} {:>12} {:>12} {:>15}".format("backend", "mode", "mismatches", "diverged",
+                                                         "matching steps"))
+        for sumo_backend in args.backends.split(","):
+            for reset_mode in V2I.reset_modes:
+                mismatches, diverged, matched = check(reset_mode, sumo_backend, args.resets, args.seed,
+                                                      args.horizon)
+                print("{:>8} {:>10} {:>9}/{} {:>9}/{} {:>15.1f}".format(sumo_backend, reset_mode,
+                                                                      mismatches, args.resets,
+                                                                      diverged, args.resets, matched))
+        return
+
+    print("{:>8} {:>10} {:>10} {:>10} {:>10}".format("backend", "mode", "p50 (ms)", "p90 (ms)", "max (ms)"))
+    for sumo_backend in args.backends.split(","):
+        for reset_mode in V2I.reset_modes:
+            latencies = measure(reset_mode, sumo_backend, args.resets, args.seed)
+            p50, p90 = np.percentile(latencies, [50, 90])
+            print("{:>8} {:>10} {:>10.2f} {:>10.2f} {:>10.2f}".format(sumo_backend, reset_mode,
+                                                                     p50, p90, latencies.max()))
+
+
+if __name__ == "__main__":
+    main()
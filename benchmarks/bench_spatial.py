@@ -0,0 +1,59 @@
+"""Scaling benchmark of the spatial index used for neighbour queries.
+
+Places N vehicles at constant density and answers radius and k-nearest
+queries for a number of ego vehicles, once by brute-force scan over all
+vehicles and once through UniformGridIndex (including its per-step
+rebuild). No SUMO process is needed.
+
+Usage: python benchmarks/bench_spatial.py [--egos 8] [--radius 20] [--k 6]
+"""
+import argparse
+import timeit
+
+import numpy as np
+
+from sumo.envs.spatial import UniformGridIndex
+
+
+def brute_force(positions, egos, radius, k):
+    for ego in egos:
+        delta = positions - positions[ego]
+        dist = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+        np.flatnonzero(dist <= radius)
+        np.argsort(dist, kind="stable")[:k]
+
+
+def indexed(index, positions, egos, radius, k):
+    index.build(positions)
+    for ego in egos:
+        index.query_radius(positions[ego], radius)
+        index.query_knn(positions[ego], k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--egos", type=int, default=8)
+    parser.add_argument("--radius", type=float, default=20)
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--density", type=float, default=10,
+                        help="Average number of vehicles within radius of a vehicle.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    index = UniformGridIndex(cell_size=args.radius)
+    print("{:>10} {:>16} {:>16} {:>8}".format("vehicles", "brute force (ms)", "grid (ms)", "speedup"))
+    for num_vehicles in (100, 1000, 10000, 100000):
+        half_extent = args.radius * np.sqrt(np.pi * num_vehicles / args.density) / 2
+        positions = rng.uniform(-half_extent, half_extent, size=(num_vehicles, 2))
+        egos = rng.choice(num_vehicles, size=min(args.egos, num_vehicles), replace=False)
+
+        number = max(1, 20000 // num_vehicles)
+        brute = min(timeit.repeat(lambda: brute_force(positions, egos, args.radius, args.k),
+                                  number=number, repeat=3)) / number
+        grid = min(timeit.repeat(lambda: indexed(index, positions, egos, args.radius, args.k),
+                                 number=number, repeat=3)) / number
+        print("{:>10} {:>16.3f} {:>16.3f} {:>7.1f}x".format(num_vehicles, brute * 1e3, grid * 1e3, brute / grid))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Import and construction time benchmark of V2I.
+
+Every run starts a fresh interpreter which times `import sumo`, importing
+V2I, constructing V2I and gymnasium.make("sumo/v2i-v0"), and lists the
+heavy modules loaded at that point. Reports medians over all runs and,
+with --reset, the first reset (which imports traci and lxml and starts
+SUMO, so it requires the `sumo` binary on PATH).
+
+Usage: python benchmarks/bench_startup.py [--runs 20] [--reset]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+CHILD = r"""
+import json, sys, time
+times = {}
+start = time.perf_counter()
+import sumo
+times["import sumo"] = time.perf_counter() - start
+
+start = time.perf_counter()
+from sumo.envs import V2I
+times["import V2I"] = time.perf_counter() - start
+
+start = time.perf_counter()
+env = V2I()
+times["construct V2I"] = time.perf_counter() - start
+
+import gymnasium as gym
+start = time.perf_counter()
+gym_env = gym.make("sumo/v2i-v0")
+times["gymnasium.make"] = time.perf_counter() - start
+
+loaded = [name for name in ("traci", "lxml.etree", "scipy", "libsumo", "sumo.xmls.defaultXMLs")
+          if name in sys.modules]
+if RESET:
+    start = time.perf_counter()
+    env.reset(seed=0)
+    times["first reset"] = time.perf_counter() - start
+    env.close()
+print(json.dumps({"times": times, "loaded": loaded}))
+"""
+
+
+def run_child(reset):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", CHILD.replace("RESET", str(reset))],
+                            capture_output=True, text=True, check=True)
+    total = time.perf_counter() - start
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    data["times"]["process total"] = total
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--reset", action="store_true")
+    args = parser.parse_args()
+
+    runs = [run_child(args.reset) for _ in range(args.runs)]
+    print("{:>16} {:>12} {:>12}".format("phase", "median (ms)", "max (ms)"))
+    for phase in runs[0]["times"]:
+        values = [run["times"][phase] * 1e3 for run in runs]
+        print("{:>16} {:>12.2f} {:>12.2f}".format(phase, statistics.median(values), max(values)))
+    print("Heavy modules loaded after construction: {}".format(", ".join(runs[0]["loaded"]) or "none"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Reproducible benchmark suite of the sumo/v2i-v0 environment.
+
+Runs the environment through gymnasium.make with fixed seeds and writes
+the results as JSON, so that runs of different releases can be compared:
+
+* throughput: steps per second of seeded random-action episodes.
+* reset: reset latency percentiles.
+* memory: RSS and Python heap growth over many short episodes.
+* scaling: steps per second and reset latency for every combination of
+  vehicle count and max_nearby_vehicles.
+
+Runs headless and requires the `sumo` binary on PATH.
+
+Usage: python benchmarks/bench_suite.py [--sections throughput,reset,memory,scaling]
+                                        [--output results.json] [--quick]
+"""
+import argparse
+import json
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import gymnasium as gym
+import numpy as np
+
+import sumo  # noqa: F401, registers sumo/v2i-v0
+
+ENV_ID = "sumo/v2i-v0"
+SECTIONS = ("throughput", "reset", "memory", "scaling")
+
+
+def percentiles(values):
+    values = np.asarray(values) * 1e3
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {"mean_ms": float(values.mean()), "p50_ms": float(p50), "p90_ms": float(p90),
+            "p99_ms": float(p99), "max_ms": float(values.max())}
+
+
+def rss_mb():
+    """Current resident set size of this process in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / 2**20
+    except OSError:
+        # Peak instead of current RSS, in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def run_steps(env, steps, seed):
+    """Steps env with seeded random actions, resetting finished episodes.
+    Returns steps per second, excluding the resets."""
+    rng = np.random.default_rng(seed)
+    actions = rng.uniform(env.action_space.low[0], env.action_space.high[0], size=steps)
+    episode = 0
+    env.reset(seed=seed)
+    elapsed = 0.0
+    for action in actions:
+        start = time.perf_counter()
+        _, _, terminated, truncated, _ = env.step(action)
+        elapsed += time.perf_counter() - start
+        if terminated or truncated:
+            episode += 1
+            env.reset(seed=seed + episode)
+    return steps / elapsed
+
+
+def run_resets(env, resets, seed):
+    """Reset latencies in seconds, the first reset starting SUMO is excluded."""
+    env.reset(seed=seed)
+    latencies = []
+    for episode in range(resets):
+        start = time.perf_counter()
+        env.reset(seed=seed + episode)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_throughput(args, env_kwargs):
+    env = gym.make(ENV_ID, **env_kwargs)
+    sps = run_steps(env, args.steps, args.seed)
+    env.close()
+    return {"steps": args.steps, "steps_per_sec": sps}
+
+
+def bench_reset(args, env_kwargs):
+    env = gym.make(ENV_ID, **env_kwargs)
+    latencies = run_resets(env, args.resets, args.seed)
+    env.close()
+    return {"resets": args.resets, **percentiles(latencies)}
+
+
+def bench_memory(args, env_kwargs):
+    """Runs many short episodes and samples memory every few episodes."""
+    env = gym.make(ENV_ID, **env_kwargs)
+    env.action_space.seed(args.seed)
+    # Warm up, so that SUMO, caches and buffers exist before the baseline
+    env.reset(seed=args.seed)
+    tracemalloc.start()
+    samples = []
+    interval = max(args.episodes // 10, 1)
+    for episode in range(args.episodes):
+        env.reset(seed=args.seed + episode)
+        for _ in range(args.episode_steps):
+            _, _, terminated, truncated, _ = env.step(env.action_space.sample()[0])
+            if terminated or truncated:
+                break
+        if episode % interval == 0 or episode == args.episodes - 1:
+            samples.append({"episode": episode,
+                            "rss_mb": rss_mb(),
+                            "heap_mb": tracemalloc.get_traced_memory()[0] / 2**20})
+    tracemalloc.stop()
+    env.close()
+    return {"episodes": args.episodes,
+            "episode_steps": args.episode_steps,
+            "rss_growth_mb": samples[-1]["rss_mb"] - samples[0]["rss_mb"],
+            "heap_growth_mb": samples[-1]["heap_mb"] - samples[0]["heap_mb"],
+            "samples": samples}
+
+
+def bench_scaling(args, env_kwargs):
+    results = []
+    for num_vehicles in args.num_vehicles:
+        for max_nearby_vehicles in args.max_nearby_vehicles:
+            env = gym.make(ENV_ID, **{**env_kwargs,
+                                      "num_vehicles": num_vehicles,
+                                      "max_nearby_vehicles": max_nearby_vehicles})
+            latencies = run_resets(env, args.scaling_resets, args.seed)
+            sps = run_steps(env, args.scaling_steps, args.seed)
+            env.close()
+            results.append({"num_vehicles": num_vehicles,
+                            "max_nearby_vehicles": max_nearby_vehicles,
+                            "steps_per_sec": sps,
+                            "reset": percentiles(latencies)})
+    return results
+
+
+BENCHMARKS = {
+    "throughput": bench_throughput,
+    "reset": bench_reset,
+    "memory": bench_memory,
+    "scaling": bench_scaling,
+}
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=str, default=",".join(SECTIONS))
+    parser.add_argument("--output", type=str, default=None, help="JSON file, stdout if not given")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--steps", type=int, default=5000)
+    parser.add_argument("--resets", type=int, default=100)
+    parser.add_argument("--episodes", type=int, default=1000)
+    parser.add_argument("--episode-steps", type=int, default=20)
+    parser.add_argument("--num-vehicles", type=int_list, default=[10, 50, 100, 200])
+    parser.add_argument("--max-nearby-vehicles", type=int_list, default=[2, 6, 16])
+    parser.add_argument("--scaling-steps", type=int, default=1000)
+    parser.add_argument("--scaling-resets", type=int, default=10)
+    parser.add_argument("--obs-backend", type=str, default="polling")
+    parser.add_argument("--sumo-backend", type=str, default="traci")
+    parser.add_argument("--reset-mode", type=str, default="load")
+    parser.add_argument("--quick", action="store_true", help="Small run for smoke testing")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.steps, args.resets, args.episodes = 500, 10, 20
+        args.num_vehicles, args.max_nearby_vehicles = [10, 50], [6]
+        args.scaling_steps, args.scaling_resets = 200, 3
+
+    sections = args.sections.split(",")
+    for section in sections:
+        if section not in BENCHMARKS:
+            parser.error("Invalid section: {}, Expected one of {}.".format(section, SECTIONS))
+
+    env_kwargs = {"obs_backend": args.obs_backend,
+                  "sumo_backend": args.sumo_backend,
+                  "reset_mode": args.reset_mode}
+    results = {"env_id": ENV_ID,
+               "env_kwargs": env_kwargs,
+               "config": {k: v for k, v in vars(args).items() if k not in ("output", "sections")},
+               "platform": {"python": sys.version.split()[0],
+                            "machine": platform.machine(),
+                            "system": platform.system(),
+                            "numpy": np.__version__,
+                            "gymnasium": gym.__version__},
+               "results": {}}
+    for section in sections:
+        start = time.perf_counter()
+        results["results"][section] = BENCHMARKS[section](args, env_kwargs)
+        print("{} done in {:.1f}s".format(section, time.perf_counter() - start), file=sys.stderr)
+
+    data = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(data + "\n")
+    else:
+        print(data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Scaling benchmark of the V2X beacon channel.
+
+Places N vehicles at constant density around two roadside units and runs
+V2XChannel steps with one receiving vehicle, every vehicle beaconing at
+every step, and reports the time per step and the beacons delivered per
+step. No SUMO process is needed.
+
+Usage: python benchmarks/bench_v2x.py [--comm-range 100] [--packet-loss 0.1] [--latency 0.2]
+"""
+import argparse
+import timeit
+
+import numpy as np
+
+from sumo.envs.v2x import V2XChannel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--comm-range", type=float, default=100)
+    parser.add_argument("--packet-loss", type=float, default=0.1)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--density", type=float, default=50,
+                        help="Average number of vehicles within range of a vehicle.")
+    parser.add_argument("--steps", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print("{:>10} {:>14} {:>16}".format("vehicles", "step (ms)", "delivered/step"))
+    for num_vehicles in (100, 1000, 5000, 20000):
+        half_extent = args.comm_range * np.sqrt(np.pi * num_vehicles / args.density) / 2
+        positions = rng.uniform(-half_extent, half_extent, size=(num_vehicles, 2))
+        speeds = rng.uniform(0, 30, size=num_vehicles)
+        ids = ["car_{}".format(idx) for idx in range(num_vehicles)]
+        rsus = rng.uniform(-half_extent, half_extent, size=(2, 2))
+
+        channel = V2XChannel(comm_range=args.comm_range, packet_loss=args.packet_loss, latency=args.latency)
+        channel.reset(rsus, num_receivers=1, t_step=0.1, np_random=np.random.default_rng(0))
+        now = [0]
+
+        def step():
+            now[0] += 1
+            channel.step(now[0], ids, positions, speeds, ["car_0"])
+
+        step()
+        elapsed = min(timeit.repeat(step, number=args.steps, repeat=3)) / args.steps
+        delivered = channel.stats().get("delivered", 0) / now[0]
+        print("{:>10} {:>14.3f} {:>16.1f}".format(num_vehicles, elapsed * 1e3, delivered))
+
+
+if __name__ == "__main__":
+    main()
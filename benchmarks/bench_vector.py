@@ -0,0 +1,52 @@
+"""Throughput benchmark of V2IVectorEnv.
+
+Steps V2IVectorEnv with random actions for 1, 2, 4, ... workers up to the
+number of CPU cores and reports total environment steps per second, for
+the pickled and the shared memory transport. Requires the `sumo` binary
+on PATH.
+
+Usage: python benchmarks/bench_vector.py [--steps 500] [--max-envs N] [--transports pipe,shared_memory]
+"""
+import argparse
+import os
+import time
+
+from sumo.envs.vector import V2IVectorEnv
+
+
+def measure(num_envs, steps, seed, shared_memory):
+    env = V2IVectorEnv(num_envs, shared_memory=shared_memory, copy=not shared_memory)
+    env.reset(seed=seed)
+    env.action_space.seed(seed)
+    actions = [env.action_space.sample() for _ in range(steps)]
+    start = time.perf_counter()
+    for action in actions:
+        env.step(action)
+    elapsed = time.perf_counter() - start
+    env.close()
+    return num_envs * steps / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--max-envs", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--transports", type=str, default="pipe,shared_memory")
+    args = parser.parse_args()
+
+    num_envs = [1]
+    while num_envs[-1] * 2 <= args.max_envs:
+        num_envs.append(num_envs[-1] * 2)
+
+    print("{:>14} {:>6} {:>12} {:>10}".format("transport", "envs", "steps/sec", "scaling"))
+    for transport in args.transports.split(","):
+        baseline = None
+        for n in num_envs:
+            sps = measure(n, args.steps, args.seed, transport == "shared_memory")
+            baseline = baseline or sps
+            print("{:>14} {:>6} {:>12.1f} {:>9.2f}x".format(transport, n, sps, sps / baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,27 @@
-from sumo.envs.v2i import V2I
\ No newline at end of file
+import importlib
+
+# Envs are imported on first access, `import sumo.envs` stays cheap.
+_exports = {
+    "V2I": "sumo.envs.v2i",
+    "V2IVectorEnv": "sumo.envs.vector",
+    "V2IParallelEnv": "sumo.envs.multi_agent",
+    "SumoServerPool": "sumo.envs.pool",
+    "TrafficGenerator": "sumo.envs.traffic",
+    "V2XChannel": "sumo.envs.v2x",
+    "EvaluationRunner": "sumo.envs.evaluation",
+    "CheckpointCache": "sumo.envs.checkpoint",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name in _exports:
+        value = getattr(importlib.import_module(_exports[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,150 @@
+import os
+import shutil
+import itertools
+import tempfile
+import collections
+from typing import Hashable, Optional
+
+from sumo.envs.scenario import default_workspace_root
+
+
+class CheckpointCache:
+    """Bounded cache of simulation checkpoints, see V2I.fork.
+
+    A checkpoint is a SUMO state file plus the env state that goes with
+    it, stored under a key chosen by the caller, typically a search tree
+    node. With storage="tmpfs" state files stay in a private directory
+    under workspace_dir (RAM-backed /dev/shm when available), with
+    storage="memory" their contents are kept in memory and written back
+    on restore. compress saves gzipped states, about five times smaller
+    and a few milliseconds slower to save and load.
+
+    When more than max_checkpoints checkpoints or more than max_bytes of
+    state files are held, the least recently forked or restored ones are
+    evicted.
+    """
+
+    storages = ("tmpfs", "memory")
+
+    def __init__(self,
+                 max_checkpoints: int=64,
+                 max_bytes: Optional[int]=None,
+                 storage: str="tmpfs",
+                 compress: bool=False,
+                 workspace_dir: Optional[str]=None):
+        if max_checkpoints < 1:
+            raise ValueError("Max checkpoints must be greater than zero.")
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError("Max bytes must be greater than zero.")
+        if storage not in self.storages:
+            raise ValueError("Invalid storage: {}, Expected one of {}.".format(storage, self.storages))
+        self._max_checkpoints = max_checkpoints
+        self._max_bytes = max_bytes
+        self._storage = storage
+        self._suffix = ".xml.gz" if compress else ".xml"
+        self._workspace_root = workspace_dir or default_workspace_root()
+        self._workspace = None
+        self._names = itertools.count()
+        self._keys = itertools.count()
+        # key -> (state file path or contents, size, env state), oldest first
+        self._entries = collections.OrderedDict()
+        self._nbytes = 0
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable):
+        return key in self._entries
+
+    def __del__(self):
+        if getattr(self, "_workspace", None) is not None:
+            self.close()
+
+    @property
+    def nbytes(self):
+        """Size of the state files held."""
+        return self._nbytes
+
+    def stats(self):
+        return {"checkpoints": len(self._entries),
+                "bytes": self._nbytes,
+                "evictions": self._evictions}
+
+    def keys(self):
+        """Keys held, least recently used first."""
+        return list(self._entries)
+
+    def new_key(self):
+        return next(self._keys)
+
+    def new_path(self):
+        """Fresh path for SUMO to save a state to, see put."""
+        if self._workspace is None:
+            os.makedirs(self._workspace_root, exist_ok=True)
+            self._workspace = tempfile.mkdtemp(prefix="v2i-checkpoints-", dir=self._workspace_root)
+        return os.path.join(self._workspace, "{}{}".format(next(self._names), self._suffix))
+
+    def put(self, key: Hashable, statePath: str, state: dict):
+        """Stores the state file at statePath, taken over by the cache, and
+        the env state under key, replacing any checkpoint of that key."""
+        self.discard(key)
+        size = os.path.getsize(statePath)
+        if self._storage == "memory":
+            with open(statePath, "rb") as f:
+                data = f.read()
+            os.remove(statePath)
+            self._entries[key] = (data, size, state)
+        else:
+            self._entries[key] = (statePath, size, state)
+        self._nbytes += size
+        self._evict()
+
+    def get(self, key: Hashable):
+        """Returns the path of the state file and the env state of key,
+        marking it most recently used. Paths of in memory checkpoints are
+        only valid until the next get."""
+        try:
+            stored, _, state = self._entries[key]
+        except KeyError:
+            raise KeyError("No checkpoint {!r}, it was evicted or never forked.".format(key)) from None
+        self._entries.move_to_end(key)
+        if self._storage == "memory":
+            path = os.path.join(self._workspace, "restore{}".format(self._suffix))
+            with open(path, "wb") as f:
+                f.write(stored)
+            return path, state
+        return stored, state
+
+    def discard(self, key: Hashable):
+        """Removes the checkpoint of key, if any."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._remove(entry)
+
+    def clear(self):
+        while self._entries:
+            self._remove(self._entries.popitem(last=False)[1])
+
+    def close(self):
+        """Removes all checkpoints and the directory holding them."""
+        self.clear()
+        if self._workspace is not None:
+            shutil.rmtree(self._workspace, ignore_errors=True)
+            self._workspace = None
+
+    def _evict(self):
+        # The newest checkpoint is kept even if it alone exceeds max_bytes
+        while len(self._entries) > 1 and (len(self._entries) > self._max_checkpoints or
+                                          (self._max_bytes is not None and self._nbytes > self._max_bytes)):
+            self._remove(self._entries.popitem(last=False)[1])
+            self._evictions += 1
+
+    def _remove(self, entry):
+        stored, size, _ = entry
+        self._nbytes -= size
+        if self._storage == "tmpfs":
+            try:
+                os.remove(stored)
+            except FileNotFoundError:
+                pass
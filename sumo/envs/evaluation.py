@@ -0,0 +1,193 @@
+import time
+import bisect
+import multiprocessing as mp
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+# Env and policy of an evaluation worker process
+_worker_state = {}
+
+
+class RunningStats:
+    """Mean, variance (Welford) and exact percentiles of a stream of
+    values, updated one value at a time."""
+
+    def __init__(self):
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._sorted = []
+
+    def add(self, value: float):
+        value = float(value)
+        self._count += 1
+        delta = value - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (value - self._mean)
+        bisect.insort(self._sorted, value)
+
+    def summary(self, percentiles: Sequence[float]=(5, 25, 50, 75, 95)):
+        """Count, mean, sample std, half width of the normal 95%
+        confidence interval of the mean, min, max and percentiles."""
+        if self._count == 0:
+            return {"count": 0}
+        std = (self._m2 / (self._count - 1)) ** 0.5 if self._count > 1 else 0.0
+        summary = {"count": self._count,
+                   "mean": self._mean,
+                   "std": std,
+                   "ci95": 1.96 * std / self._count ** 0.5,
+                   "min": self._sorted[0],
+                   "max": self._sorted[-1]}
+        values = np.percentile(self._sorted, percentiles)
+        for q, value in zip(percentiles, values):
+            summary["p{:g}".format(q)] = float(value)
+        return summary
+
+
+class EvaluationAggregator:
+    """Streaming aggregate of episode results.
+
+    Results may arrive in any order. They are folded into the statistics
+    in the order of the seed list, as soon as all results of earlier seeds
+    are in, so aggregates do not depend on the number of workers or on
+    which episode finished first.
+    """
+
+    metrics = ("return", "length", "collided")
+
+    def __init__(self, seeds: Sequence[int]):
+        self._order = {seed: idx for idx, seed in enumerate(seeds)}
+        if len(self._order) != len(seeds):
+            raise ValueError("Seeds must be unique.")
+        self._pending = {}
+        self._next = 0
+        self._stats = {name: RunningStats() for name in self.metrics}
+        self._step_time = RunningStats()
+
+    @property
+    def num_episodes(self):
+        return self._next
+
+    def add(self, result: dict):
+        self._pending[self._order[result["seed"]]] = result
+        while self._next in self._pending:
+            result = self._pending.pop(self._next)
+            for name in self.metrics:
+                self._stats[name].add(result[name])
+            self._step_time.add(result["step_time"])
+            self._next += 1
+
+    def summary(self):
+        """Statistics of the episodes folded in so far. Step times are
+        wall clock and vary between runs."""
+        summary = {name: stats.summary() for name, stats in self._stats.items()}
+        summary["step_time"] = self._step_time.summary()
+        return summary
+
+
+def _make_env(env_id: str, env_kwargs: dict):
+    import gymnasium as gym
+    import sumo  # noqa: F401, registers the envs
+    return gym.make(env_id, **env_kwargs)
+
+
+def _init_worker(env_id: str, env_kwargs: dict, policy: Callable):
+    env = _worker_state["env"] = _make_env(env_id, env_kwargs)
+    _worker_state["policy"] = policy
+    # Stops SUMO when the pool shuts the worker down
+    mp.util.Finalize(env, env.close, exitpriority=10)
+
+
+def _run_worker_episode(seed: int):
+    return run_episode(_worker_state["env"], _worker_state["policy"], seed)
+
+
+def run_episode(env, policy: Callable, seed: int):
+    """Runs one episode of env seeded with seed, taking actions from
+    policy(observation). Returns the seed, return, length, whether ego
+    collided and the mean wall clock time per step."""
+    obs, _ = env.reset(seed=seed)
+    episode_return = 0.0
+    length = 0
+    collided = False
+    step_time = 0.0
+    while True:
+        action = policy(obs)
+        start = time.perf_counter()
+        obs, reward, terminated, truncated, info = env.step(action)
+        step_time += time.perf_counter() - start
+        episode_return += reward
+        length += 1
+        if terminated or truncated:
+            collided = bool(info.get("collided", False))
+            break
+    return {"seed": seed,
+            "return": episode_return,
+            "length": length,
+            "collided": collided,
+            "step_time": step_time / length}
+
+
+class EvaluationRunner:
+    """Evaluates a policy over a list of seeds, one episode per seed, on a
+    process pool of gymnasium.make(env_id) instances.
+
+    policy(observation) returns an action and must be picklable with the
+    chosen multiprocessing context. Each worker owns one env for all its
+    episodes. Episodes are seeded through reset, so their results do not
+    depend on the worker running them, except with reset_mode="soft".
+    """
+
+    def __init__(self,
+                 policy: Callable,
+                 num_workers: int=1,
+                 env_id: str="sumo/v2i-v0",
+                 env_kwargs: Optional[dict]=None,
+                 context: Optional[str]=None):
+        if num_workers < 1:
+            raise ValueError("Number of workers must be greater than zero.")
+        self._policy = policy
+        self._num_workers = num_workers
+        self._env_id = env_id
+        self._env_kwargs = dict(env_kwargs or {})
+        self._context = context
+
+    def run(self, seeds: Sequence[int]):
+        """Yields episode results as episodes finish."""
+        if self._num_workers == 1:
+            # No pool, episodes run in this process
+            env = _make_env(self._env_id, self._env_kwargs)
+            try:
+                for seed in seeds:
+                    yield run_episode(env, self._policy, seed)
+            finally:
+                env.close()
+            return
+
+        ctx = mp.get_context(self._context)
+        with ProcessPoolExecutor(max_workers=self._num_workers, mp_context=ctx,
+                                 initializer=_init_worker,
+                                 initargs=(self._env_id, self._env_kwargs, self._policy)) as pool:
+            futures = [pool.submit(_run_worker_episode, seed) for seed in seeds]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def evaluate(self, seeds: Sequence[int], callback: Optional[Callable]=None):
+        """Runs all seeds and returns the aggregate summary.
+
+        callback(result, aggregator), if given, is called as every episode
+        finishes, e.g. to report progress.
+        """
+        aggregator = EvaluationAggregator(seeds)
+        for result in self.run(seeds):
+            aggregator.add(result)
+            if callback is not None:
+                callback(result, aggregator)
+        return aggregator.summary()
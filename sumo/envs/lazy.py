@@ -0,0 +1,30 @@
+import importlib
+
+
+class LazyModule:
+    """Stands in for a module which is only imported on first attribute
+    access, so that importing or constructing an env stays cheap.
+
+    Looked up attributes are cached on the instance, later accesses cost
+    the same as on the module itself.
+    """
+
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        value = getattr(self._load(), attr)
+        self.__dict__[attr] = value
+        return value
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return "<lazy module '{}' ({})>".format(self.__dict__["_name"], state)
@@ -0,0 +1,223 @@
+import numpy as np
+
+from sumo.envs.v2i import V2I, tcc
+
+
+class V2IParallelEnv(V2I):
+    """Multi-agent version of V2I with a PettingZoo style parallel API.
+
+    The ego vehicle and the num_agents - 1 vehicles departing right before
+    it are controlled externally, all in one SUMO instance. step takes a
+    dict of accelerations keyed by agent and returns dicts of observations,
+    rewards, terminations, truncations and infos. Observations, rewards
+    and termination rules per agent are the ones of V2I.
+
+    All vehicles are subscribed to, as with obs_backend="grid", and the
+    observations of all agents are built from one distance computation
+    per step.
+    """
+
+    metadata = {"render_modes": ["human"], "name": "v2i_parallel_v0"}
+
+    def __init__(self, num_agents: int=4, **kwargs):
+        if "obs_backend" in kwargs:
+            raise ValueError("V2IParallelEnv always uses the grid obs backend.")
+        if (kwargs.get("record_dir") is not None or kwargs.get("v2x") is not None or kwargs.get("num_traffic_lights")
+                or kwargs.get("checkpoints") is not None or kwargs.get("obs_mode", "vector") != "vector"):
+            raise ValueError("V2IParallelEnv does not support recording, V2X messaging, traffic light observations, "
+                             "checkpoints and image observations.")
+        super().__init__(obs_backend="grid", **kwargs)
+
+        ego_idx = self._traffic.ego_index
+        if num_agents < 1 or num_agents > ego_idx + 1:
+            raise ValueError("Number of agents must be in [1, {}], Got: {}.".format(ego_idx + 1, num_agents))
+
+        # Vehicles depart in order, so the ones before ego are in the
+        # simulation when an episode starts.
+        self.possible_agents = ["ego"] + ["car_{}".format(ego_idx - i) for i in range(1, num_agents)]
+        self.agents = []
+
+        # Spaces are per agent, see observation_space(agent)
+        obs_space = self.__dict__.pop("observation_space")
+        act_space = self.__dict__.pop("action_space")
+        self.observation_spaces = {agent: obs_space for agent in self.possible_agents}
+        self.action_spaces = {agent: act_space for agent in self.possible_agents}
+
+    @property
+    def num_agents(self):
+        return len(self.agents)
+
+    @property
+    def max_num_agents(self):
+        return len(self.possible_agents)
+
+    def observation_space(self, agent: str):
+        return self.observation_spaces[agent]
+
+    def action_space(self, agent: str):
+        return self.action_spaces[agent]
+
+    def _subscribe_episode_state(self, tc):
+        """Subscribes to the simulation variables read by step and to the
+        speed, max speed and position of every agent.
+        """
+        tc.simulation.subscribe([tcc.VAR_COLLIDING_VEHICLES_IDS,
+                                 tcc.VAR_ARRIVED_VEHICLES_IDS,
+                                 tcc.VAR_MIN_EXPECTED_VEHICLES,
+                                 tcc.VAR_DEPARTED_VEHICLES_IDS])
+        for agent in self.agents:
+            tc.vehicle.subscribe(agent, [tcc.VAR_POSITION, tcc.VAR_SPEED, tcc.VAR_MAXSPEED])
+
+    def _reset(self):
+        tc = self._start_episode()
+
+        present = set(tc.vehicle.getIDList())
+        self.agents = [agent for agent in self.possible_agents if agent in present]
+        if len(self.agents) < len(self.possible_agents):
+            self._logger.warning("Only {} of {} agents are in the simulation.".format(len(self.agents),
+                                                                                      len(self.possible_agents)))
+
+        # Disable all checks for the controlled vehicles
+        for agent in self.agents:
+            tc.vehicle.setSpeedMode(agent, 32)
+
+        self._subscribe_all_vehicles(tc)
+        self._subscribe_episode_state(tc)
+
+        # Reset step counter
+        self._current_t_steps = 0
+
+        with self._profiler.phase("reset.get_obs"):
+            obs, nearby = self._get_agents_obs(tc, self.agents)
+        infos = {agent: {"num_vehicles_nearby": int(n)} for agent, n in zip(self.agents, nearby)}
+        return dict(zip(self.agents, obs)), infos
+
+    def reset(self, seed=None, options=None):
+        obs, infos = super().reset(seed=seed, options=options)
+        # The profile of the reset is reported once, with the ego agent
+        profile = infos.pop("profile", None)
+        if profile is not None and "ego" in infos:
+            infos["ego"]["profile"] = profile
+        return obs, infos
+
+    def _get_agents_obs(self, tc, agents):
+        """Observations of the given agents from one shared pass over the
+        positions of all vehicles."""
+        self._update_vehicle_index(tc)
+        num_vehicles = len(self._vehicle_ids)
+        positions, speeds = self._obs_builder.buffers(num_vehicles)
+        positions[:] = self._vehicle_index.positions
+        speeds[:] = self._vehicle_speeds
+        index = {veh_id: idx for idx, veh_id in enumerate(self._vehicle_ids)}
+        refs = positions[[index[agent] for agent in agents]]
+        obs, nearby = self._obs_builder.build_batch(refs, num_vehicles)
+        return obs.reshape(len(agents), -1), nearby
+
+    def step(self, actions: dict):
+        tc = self._tc
+        agents = self.agents
+        missing = [agent for agent in agents if agent not in actions]
+        if missing:
+            raise ValueError("Missing actions for agents: {}.".format(missing))
+
+        accel = np.array([float(np.asarray(actions[agent]).reshape(-1)[0]) for agent in agents])
+        low, high = self._vehicle_config['maxDecel'], self._vehicle_config['maxAccel']
+        if np.any((accel < low) | (accel > high)):
+            raise ValueError("Invalid actions: {}, Expected [{}, {}].".format(accel, low, high))
+
+        self._profiler.begin()
+        with self._profiler.phase("step"):
+            result = self._step_agents(tc, agents, accel)
+        if self._profiler.enabled and "ego" in result[4]:
+            result[4]["ego"]["profile"] = self._profiler.last()
+        return result
+
+    def _step_agents(self, tc, agents, accel):
+        # As in V2I, actions are repeated for action_repeat simulation
+        # steps and observations are only built after the last one. Agents
+        # that terminate in between stop there.
+        rewards = dict.fromkeys(agents, 0)
+        terminations = dict.fromkeys(agents, False)
+        alive = list(agents)
+        actions = dict(zip(agents, accel))
+        for _ in range(self._action_repeat):
+            step_rewards, finished, truncated = self._advance_agents(tc, alive,
+                                                                     np.array([actions[agent] for agent in alive]))
+            for agent, reward in step_rewards.items():
+                rewards[agent] += reward
+            for agent in finished:
+                terminations[agent] = True
+            alive = [agent for agent in alive if agent not in finished]
+            if truncated or not alive:
+                break
+
+        observations = {}
+        truncations = dict.fromkeys(agents, truncated)
+        infos = {agent: {} for agent in agents}
+        terminal_state = np.array([-1, -1, -1] * self._max_nearby_vehicles).flatten()
+        for agent in agents:
+            if terminations[agent]:
+                observations[agent] = terminal_state
+
+        if alive:
+            with self._profiler.phase("step.get_obs"):
+                obs, nearby = self._get_agents_obs(tc, alive)
+            for i, agent in enumerate(alive):
+                observations[agent] = obs[i]
+                infos[agent] = {"num_vehicles_nearby": int(nearby[i])}
+
+        # Finished agents leave the episode
+        self.agents = [] if truncated else alive
+        return observations, rewards, terminations, truncations, infos
+
+    def _advance_agents(self, tc, agents, accel):
+        """Applies the actions of agents for a single simulation step.
+        Returns the reward of the step per agent, the set of agents that
+        terminated and truncated.
+        """
+        self._current_t_steps += 1
+        assert self._current_t_steps <= self._max_time_steps
+        profiler = self._profiler
+
+        with profiler.phase("step.set_speed"):
+            # New speeds of all agents are computed together
+            speeds = np.array([tc.vehicle.getSubscriptionResults(agent)[tcc.VAR_SPEED] for agent in agents])
+            new_speeds = np.clip(speeds + accel * self._t_step, a_min=0.0, a_max=self._vehicle_config['maxSpeed'])
+            for agent, speed in zip(agents, new_speeds):
+                tc.vehicle.setSpeed(agent, speed)
+
+        with profiler.phase("step.simulation_step"):
+            tc.simulationStep()
+            self._subscribe_departed_vehicles(tc)
+
+        rewards, finished = {}, set()
+        with profiler.phase("step.termination_check"):
+            sim_state = tc.simulation.getSubscriptionResults()
+            collided = set(sim_state[tcc.VAR_COLLIDING_VEHICLES_IDS])
+            arrived = set(sim_state[tcc.VAR_ARRIVED_VEHICLES_IDS])
+            done = sim_state[tcc.VAR_MIN_EXPECTED_VEHICLES] <= 0
+            truncated = self._current_t_steps >= self._max_time_steps
+
+            for agent in agents:
+                if agent in collided:
+                    self._logger.warn("Agent {} has collided".format(agent))
+                    rewards[agent] = -30
+                    finished.add(agent)
+                elif agent in arrived or done:
+                    rewards[agent] = 0
+                    finished.add(agent)
+
+        with profiler.phase("step.reward"):
+            for agent in agents:
+                if agent not in finished:
+                    state = tc.vehicle.getSubscriptionResults(agent)
+                    rewards[agent] = state[tcc.VAR_SPEED] / state[tcc.VAR_MAXSPEED]
+
+        # Collided agents would stay in the network as overlapping wrecks
+        # at speed mode 32, since collisions only warn. They are removed,
+        # arrived agents already left.
+        for agent in agents:
+            if agent in collided:
+                tc.vehicle.unsubscribe(agent)
+                tc.vehicle.remove(agent)
+        return rewards, finished, truncated
@@ -0,0 +1,109 @@
+import numpy as np
+
+
+class NearbyObservationBuilder:
+    """Builds the nearby vehicles observation of a single vehicle with NumPy.
+
+    Positions and speeds of candidate vehicles are written by the caller
+    into preallocated buffers (see `buffers`). `build` then computes all
+    distances in one vectorized op, picks the k nearest with argpartition
+    and writes (x, y, speed) rows relative to the reference vehicle into a
+    reusable (max_nearby_vehicles, 3) float32 array. Empty rows are filled
+    with -1.
+    """
+
+    def __init__(self,
+                 view_size: float,
+                 max_nearby_vehicles: int,
+                 capacity: int=64):
+        self._view_size = view_size
+        self._max_nearby_vehicles = max_nearby_vehicles
+        self._out = np.full((max_nearby_vehicles, 3), -1, dtype=np.float32)
+        self._reserve(capacity)
+
+    def _reserve(self, capacity: int):
+        self._capacity = capacity
+        self._positions = np.zeros((capacity, 2), dtype=np.float64)
+        self._speeds = np.zeros(capacity, dtype=np.float64)
+        self._rel = np.zeros((capacity, 2), dtype=np.float64)
+        self._dist = np.zeros(capacity, dtype=np.float64)
+
+    def buffers(self, num_vehicles: int):
+        """Returns (positions, speeds) views of shape (num_vehicles, 2) and
+        (num_vehicles,) to be filled by the caller. Buffers only grow, so
+        they are reallocated at most a handful of times per run.
+        """
+        if num_vehicles > self._capacity:
+            self._reserve(max(num_vehicles, 2 * self._capacity))
+        return self._positions[:num_vehicles], self._speeds[:num_vehicles]
+
+    def in_range(self, ref_pos, num_vehicles: int):
+        """Returns indices of buffered vehicles within view of ref_pos."""
+        dist = self._distances(ref_pos, num_vehicles)
+        return np.flatnonzero(dist <= self._view_size)
+
+    def _distances(self, ref_pos, num_vehicles: int):
+        rel = self._rel[:num_vehicles]
+        dist = self._dist[:num_vehicles]
+        np.subtract(self._positions[:num_vehicles], ref_pos, out=rel)
+        np.einsum("ij,ij->i", rel, rel, out=dist)
+        np.sqrt(dist, out=dist)
+        return dist
+
+    def build(self, ref_pos, num_vehicles: int, out=None):
+        """Builds the observation from the first num_vehicles buffered vehicles.
+
+        Returns the (max_nearby_vehicles, 3) observation and the number of
+        vehicles within view. The returned array is reused by the next call
+        unless out is given.
+        """
+        if out is None:
+            out = self._out
+        dist = self._distances(ref_pos, num_vehicles)
+        num_in_range = int(np.count_nonzero(dist <= self._view_size))
+        k = min(self._max_nearby_vehicles, num_in_range)
+
+        if k < num_in_range:
+            part = np.argpartition(dist, k - 1)
+            cutoff = dist[part[k - 1]]
+        else:
+            cutoff = self._view_size
+        # Candidates are kept in buffer order and sorted stably, so vehicles
+        # at equal distance keep the order in which SUMO reported them.
+        candidates = np.flatnonzero(dist <= cutoff)
+        nearest = candidates[np.argsort(dist[candidates], kind="stable")[:k]]
+
+        out[:k, :2] = self._rel[nearest]
+        out[:k, 2] = self._speeds[nearest]
+        out[k:] = -1
+        return out, num_in_range
+
+    def build_batch(self, ref_positions, num_vehicles: int, out=None):
+        """Builds the observations of several reference vehicles at once.
+
+        Distances of every reference vehicle to the first num_vehicles
+        buffered vehicles are computed in one (num_refs, num_vehicles) op.
+        Rows equal the ones of `build` for each reference vehicle. Returns
+        a new (num_refs, max_nearby_vehicles, 3) array, unless out is given,
+        and the number of vehicles within view of each reference vehicle.
+        """
+        ref_positions = np.asarray(ref_positions, dtype=np.float64).reshape(-1, 2)
+        num_refs = len(ref_positions)
+        if out is None:
+            out = np.empty((num_refs, self._max_nearby_vehicles, 3), dtype=np.float32)
+        rel = self._positions[None, :num_vehicles] - ref_positions[:, None]
+        dist = np.sqrt(np.einsum("aij,aij->ai", rel, rel))
+        in_view = dist <= self._view_size
+        num_in_range = np.count_nonzero(in_view, axis=1)
+
+        # Vehicles out of view sort last, the stable sort keeps buffer
+        # order among vehicles at equal distance, same as build.
+        k = min(self._max_nearby_vehicles, num_vehicles)
+        dist[~in_view] = np.inf
+        nearest = np.argsort(dist, axis=1, kind="stable")[:, :k]
+        rows = np.arange(num_refs)[:, None]
+        out[:, :k, :2] = rel[rows, nearest]
+        out[:, :k, 2] = self._speeds[nearest]
+        out[:, :k][~np.isfinite(dist[rows, nearest])] = -1
+        out[:, k:] = -1
+        return out, num_in_range
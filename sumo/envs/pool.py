@@ -0,0 +1,177 @@
+import os
+import shutil
+import logging
+import tempfile
+import itertools
+import threading
+import contextlib
+from typing import Optional
+
+from sumo.envs.lazy import LazyModule
+from sumo.envs.scenario import default_workspace_root
+
+traci = LazyModule("traci")
+
+_pool_ids = itertools.count()
+
+
+class SumoServerPool:
+    """Pool of running SUMO servers with TraCI connections, shared by the
+    envs of one process.
+
+    acquire leases a server, starting one if fewer than size exist and
+    waiting for a release otherwise. Envs load their scenario into the
+    leased server with `load`, which replaces all SUMO options, and hand
+    it back on close instead of terminating it. Servers are health checked
+    when leased, dead ones are replaced.
+
+    Servers are started with the bundled net and no routes, and stay in
+    the state of the last scenario loaded while idle. TraCI connections
+    can not be handed over between processes, so every process needs a
+    pool of its own.
+    """
+
+    def __init__(self, size: int=4, binary: str="sumo", workspace_dir: Optional[str]=None):
+        if size < 1:
+            raise ValueError("Pool size must be greater than zero.")
+        self._size = size
+        self._binary = binary
+        self._workspace_root = workspace_dir or default_workspace_root()
+        self._workspace = None
+        self._id = next(_pool_ids)
+        self._labels = itertools.count()
+        self._idle = []
+        self._leased = set()
+        self._closed = False
+        self._cond = threading.Condition()
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def num_servers(self):
+        with self._cond:
+            return len(self._idle) + len(self._leased)
+
+    @property
+    def num_idle(self):
+        with self._cond:
+            return len(self._idle)
+
+    def start(self, num_servers: Optional[int]=None):
+        """Starts servers until num_servers (size if None) are running, so
+        that later leases find them warm."""
+        num_servers = self._size if num_servers is None else min(num_servers, self._size)
+        with self._cond:
+            while len(self._idle) + len(self._leased) < num_servers:
+                self._idle.append(self._start_server())
+            self._cond.notify_all()
+
+    def acquire(self, timeout: Optional[float]=None):
+        """Leases a healthy server and returns its TraCI connection.
+        Raises TimeoutError if none is released within timeout seconds."""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("SumoServerPool is closed.")
+                while self._idle:
+                    conn = self._idle.pop()
+                    if self._is_healthy(conn):
+                        self._leased.add(conn)
+                        return conn
+                    self._logger.warning("Replacing unhealthy SUMO server {}.".format(conn._label))
+                    self._stop_server(conn)
+                if len(self._leased) < self._size:
+                    conn = self._start_server()
+                    self._leased.add(conn)
+                    return conn
+                if not self._cond.wait(timeout):
+                    raise TimeoutError("No SUMO server released within {}s.".format(timeout))
+
+    def release(self, conn):
+        """Returns a leased server to the pool."""
+        with self._cond:
+            self._leased.discard(conn)
+            if self._closed:
+                self._stop_server(conn)
+                self._remove_workspace()
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def discard(self, conn):
+        """Stops a leased server instead of returning it to the pool, e.g.
+        one left in a state that load does not reset."""
+        with self._cond:
+            self._leased.discard(conn)
+            self._stop_server(conn)
+            if self._closed:
+                self._remove_workspace()
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def lease(self, timeout: Optional[float]=None):
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Stops idle servers, leased ones are stopped when released."""
+        with self._cond:
+            self._closed = True
+            for conn in self._idle:
+                self._stop_server(conn)
+            self._idle = []
+            self._cond.notify_all()
+            self._remove_workspace()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _remove_workspace(self):
+        # Servers still leased may have the net file open
+        if self._workspace is not None and not self._leased:
+            shutil.rmtree(self._workspace, ignore_errors=True)
+            self._workspace = None
+
+    def _bootstrap_args(self):
+        """Arguments starting SUMO on the bundled net without routes."""
+        if self._workspace is None:
+            from sumo.envs.v2i import _net_file
+            os.makedirs(self._workspace_root, exist_ok=True)
+            self._workspace = tempfile.mkdtemp(prefix="v2i-pool-", dir=self._workspace_root)
+            with open(os.path.join(self._workspace, "v2v.net.xml"), "wb") as f:
+                f.write(_net_file())
+        return ["-n", os.path.join(self._workspace, "v2v.net.xml"),
+                "--xml-validation", "never",
+                "--no-step-log"]
+
+    def _start_server(self):
+        label = "pool-{}-{}".format(self._id, next(self._labels))
+        traci.start([self._binary] + self._bootstrap_args(), label=label)
+        self._logger.debug("Started SUMO server {}.".format(label))
+        return traci.getConnection(label)
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.getVersion()
+            return True
+        except (traci.exceptions.TraCIException, traci.exceptions.FatalTraCIError, OSError):
+            return False
+
+    def _stop_server(self, conn):
+        try:
+            conn.close()
+        except (traci.exceptions.TraCIException, traci.exceptions.FatalTraCIError, OSError):
+            # The server is gone already, kill the process if still running
+            if conn._process is not None:
+                conn._process.kill()
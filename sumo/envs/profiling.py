@@ -0,0 +1,157 @@
+import time
+from collections import defaultdict
+
+
+class _Phase:
+    """Context manager adding the time spent in its block to a phase."""
+
+    __slots__ = ("_profiler", "_name", "_start")
+
+    def __init__(self, profiler, name: str):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._profiler.add_time(self._name, time.perf_counter() - self._start)
+        return False
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class Profiler:
+    """Collects wall-clock time per named phase and event counters.
+
+    Phase names are dotted, a phase may nest phases named after it, e.g.
+    "reset.scenario" includes "reset.scenario.file_write". Besides the
+    running totals, the values recorded since the last call to `begin`
+    are kept, so that a single step or reset can be inspected.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Drops all recorded values."""
+        self._times = defaultdict(float)
+        self._calls = defaultdict(int)
+        self._counters = defaultdict(int)
+        self._last_times = {}
+        self._last_counters = {}
+
+    def phase(self, name: str):
+        return _Phase(self, name)
+
+    def add_time(self, name: str, seconds: float):
+        self._times[name] += seconds
+        self._calls[name] += 1
+        self._last_times[name] = self._last_times.get(name, 0.0) + seconds
+
+    def count(self, name: str, n: int=1):
+        self._counters[name] += n
+        self._last_counters[name] = self._last_counters.get(name, 0) + n
+
+    def begin(self):
+        """Starts recording a new step or reset."""
+        self._last_times = {}
+        self._last_counters = {}
+
+    def last(self):
+        """Seconds per phase and counters recorded since `begin`."""
+        return {"times": dict(self._last_times), "counters": dict(self._last_counters)}
+
+    def summary(self):
+        """Totals per phase (calls, total and mean seconds) and counters."""
+        phases = {name: {"calls": self._calls[name],
+                         "total": total,
+                         "mean": total / self._calls[name]}
+                  for name, total in sorted(self._times.items())}
+        return {"phases": phases, "counters": dict(self._counters)}
+
+
+class NullProfiler:
+    """Profiler used when profiling is disabled, every method is a no-op."""
+
+    enabled = False
+
+    def clear(self):
+        pass
+
+    def phase(self, name: str):
+        return _NULL_PHASE
+
+    def add_time(self, name: str, seconds: float):
+        pass
+
+    def count(self, name: str, n: int=1):
+        pass
+
+    def begin(self):
+        pass
+
+    def last(self):
+        return {"times": {}, "counters": {}}
+
+    def summary(self):
+        return {"phases": {}, "counters": {}}
+
+
+class _CountingDomain:
+    """Wraps a TraCI domain, counting calls that reach SUMO."""
+
+    def __init__(self, domain, profiler, counter: str):
+        self._domain = domain
+        self._profiler = profiler
+        self._counter = counter
+        self._wrapped = {}
+
+    def __getattr__(self, name):
+        wrapped = self._wrapped.get(name)
+        if wrapped is not None:
+            return wrapped
+        attr = getattr(self._domain, name)
+        # Subscription results are served from the client side cache
+        if not callable(attr) or name.endswith("SubscriptionResults"):
+            return attr
+        profiler, counter = self._profiler, self._counter
+
+        def call(*args, **kwargs):
+            profiler.count(counter)
+            return attr(*args, **kwargs)
+
+        self._wrapped[name] = call
+        return call
+
+
+class CountingConnection(_CountingDomain):
+    """Wraps a TraCI connection or the libsumo module and counts the calls
+    made through it, including the calls of its domains (vehicle,
+    simulation, ...), into the given profiler counter.
+    """
+
+    _domains = ("vehicle", "simulation", "trafficlight", "junction", "lane", "edge", "route", "vehicletype")
+
+    def __getattr__(self, name):
+        if name in self._domains:
+            wrapped = self._wrapped.get(name)
+            if wrapped is None:
+                wrapped = _CountingDomain(getattr(self._domain, name), self._profiler, self._counter)
+                self._wrapped[name] = wrapped
+            return wrapped
+        return super().__getattr__(name)
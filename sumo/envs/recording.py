@@ -0,0 +1,215 @@
+import os
+import json
+from typing import Optional, Sequence
+
+import numpy as np
+
+# Dataset layout, all files append-only:
+#   meta.json                  columns, written once
+#   chunks.bin                 int64 rows of every chunk, in order
+#   episodes.bin               int64 (start row, rows, seed) per episode
+#   chunk-NNNNNN/<column>.npy  one .npy file per column and chunk
+_META = "meta.json"
+_CHUNKS = "chunks.bin"
+_EPISODES = "episodes.bin"
+_FORMAT = 1
+
+
+def trajectory_columns(obs_shape: Sequence[int], obs_dtype: str="float32"):
+    """Per-step columns of V2I recordings as {name: (dtype, shape)}."""
+    return {"obs": (str(np.dtype(obs_dtype)), tuple(obs_shape)),
+            "action": ("float32", ()),
+            "reward": ("float64", ()),
+            "terminated": ("bool", ()),
+            "truncated": ("bool", ()),
+            "ego_pos": ("float64", (2,)),
+            "num_neighbors": ("int32", ())}
+
+
+def _append_records(path: str, records):
+    with open(path, "ab") as f:
+        f.write(np.asarray(records, dtype=np.int64).tobytes())
+
+
+def _read_records(path: str, width: int):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.zeros((0, width), dtype=np.int64)
+    return np.memmap(path, dtype=np.int64, mode="r").reshape(-1, width)
+
+
+class TrajectoryWriter:
+    """Append-only writer of step data into chunked columnar .npy files.
+
+    Rows are buffered in preallocated arrays of chunk_size rows and every
+    full chunk is written as one .npy file per column. Neighbors, the
+    absolute (x, y, speed) of the vehicles in view, vary in number per step
+    and are stored concatenated per chunk, num_neighbors splits them.
+
+    An episode is the row of its reset followed by one row per step. It is
+    added to the index once all its rows are on disk, so a reader never
+    sees partial episodes. Opening an existing dataset appends to it.
+    """
+
+    def __init__(self, path: str, columns: dict, chunk_size: int=4096):
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be greater than zero.")
+        self._path = path
+        self._chunk_size = chunk_size
+
+        os.makedirs(path, exist_ok=True)
+        metaPath = os.path.join(path, _META)
+        meta = {"format": _FORMAT, "columns": {name: [dtype, list(shape)] for name, (dtype, shape) in columns.items()}}
+        if os.path.exists(metaPath):
+            with open(metaPath) as f:
+                existing = json.load(f)
+            if existing != meta:
+                raise ValueError("Dataset at {} has different columns.".format(path))
+        else:
+            with open(metaPath, "w") as f:
+                json.dump(meta, f, indent=2)
+
+        self._buffers = {name: np.zeros((chunk_size,) + tuple(shape), dtype=dtype)
+                         for name, (dtype, shape) in columns.items()}
+        self._neighbors = []
+        chunks = _read_records(os.path.join(path, _CHUNKS), 1)
+        self._num_chunks = len(chunks)
+        self._flushed_rows = int(chunks.sum())
+        self._num_rows = 0
+        self._episode = None
+        # Episodes finished but with rows still buffered
+        self._pending = []
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def num_rows(self):
+        """Rows written so far, buffered ones included."""
+        return self._flushed_rows + self._num_rows
+
+    def begin_episode(self, seed: Optional[int]=None):
+        """Ends the current episode, if any, and starts a new one."""
+        self.end_episode()
+        self._episode = [self.num_rows, -1 if seed is None else int(seed)]
+
+    def end_episode(self):
+        if self._episode is None:
+            return
+        start, seed = self._episode
+        self._episode = None
+        if self.num_rows > start:
+            self._pending.append((start, self.num_rows - start, seed))
+
+    def append(self, neighbors=None, **values):
+        """Appends one row. values are keyed by column, missing columns are
+        zero. neighbors is an (n, 3) array."""
+        if self._episode is None:
+            raise RuntimeError("Call begin_episode before appending rows.")
+        row = self._num_rows
+        for name, buffer in self._buffers.items():
+            buffer[row] = values.get(name, 0)
+        if neighbors is not None and len(neighbors):
+            self._neighbors.append(np.asarray(neighbors, dtype=np.float64).reshape(-1, 3))
+        self._num_rows += 1
+        if self._num_rows == self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Writes buffered rows as a new chunk and indexes the episodes
+        they complete."""
+        if self._num_rows > 0:
+            chunkPath = os.path.join(self._path, "chunk-{:06d}".format(self._num_chunks))
+            os.makedirs(chunkPath, exist_ok=True)
+            for name, buffer in self._buffers.items():
+                np.save(os.path.join(chunkPath, name + ".npy"), buffer[:self._num_rows])
+            neighbors = np.concatenate(self._neighbors) if self._neighbors else np.zeros((0, 3))
+            np.save(os.path.join(chunkPath, "neighbors.npy"), neighbors)
+            _append_records(os.path.join(self._path, _CHUNKS), [self._num_rows])
+
+            self._num_chunks += 1
+            self._flushed_rows += self._num_rows
+            self._num_rows = 0
+            self._neighbors = []
+
+        done = [episode for episode in self._pending if episode[0] + episode[1] <= self._flushed_rows]
+        if done:
+            _append_records(os.path.join(self._path, _EPISODES), done)
+            self._pending = self._pending[len(done):]
+
+    def close(self):
+        self.end_episode()
+        self.flush()
+
+
+class TrajectoryReader:
+    """Random access to the episodes of a TrajectoryWriter dataset.
+
+    Chunks are memory-mapped, reading an episode only touches the chunks
+    holding its rows.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        with open(os.path.join(path, _META)) as f:
+            meta = json.load(f)
+        self._columns = list(meta["columns"])
+        rows = _read_records(os.path.join(path, _CHUNKS), 1)[:, 0]
+        self._chunk_starts = np.concatenate([[0], np.cumsum(rows)])
+        self._index = _read_records(os.path.join(path, _EPISODES), 3)
+        self._chunks = {}
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    @property
+    def num_steps(self):
+        return int(self._chunk_starts[-1])
+
+    @property
+    def index(self):
+        """(num_episodes, 3) array of episode start row, rows and seed (-1
+        if not seeded)."""
+        return self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def _chunk(self, idx: int):
+        chunk = self._chunks.get(idx)
+        if chunk is None:
+            chunkPath = os.path.join(self._path, "chunk-{:06d}".format(idx))
+            chunk = {name: np.load(os.path.join(chunkPath, name + ".npy"), mmap_mode="r")
+                     for name in self._columns + ["neighbors"]}
+            offsets = np.zeros(len(chunk["num_neighbors"]) + 1, dtype=np.int64)
+            np.cumsum(chunk["num_neighbors"], out=offsets[1:])
+            chunk["neighbor_offsets"] = offsets
+            self._chunks[idx] = chunk
+        return chunk
+
+    def rows(self, start: int, stop: int):
+        """Returns the columns of rows [start, stop) as a dict of arrays,
+        with the neighbors of those rows concatenated under "neighbors"."""
+        if start < 0 or stop > self.num_steps or start > stop:
+            raise IndexError("Rows [{}, {}) out of range [0, {}).".format(start, stop, self.num_steps))
+        parts = {name: [] for name in self._columns + ["neighbors"]}
+        first = int(np.searchsorted(self._chunk_starts, start, side="right")) - 1
+        idx = first
+        while idx < len(self._chunk_starts) - 1 and self._chunk_starts[idx] < stop:
+            chunk = self._chunk(idx)
+            lo = max(start, self._chunk_starts[idx]) - self._chunk_starts[idx]
+            hi = min(stop, self._chunk_starts[idx + 1]) - self._chunk_starts[idx]
+            for name in self._columns:
+                parts[name].append(chunk[name][lo:hi])
+            offsets = chunk["neighbor_offsets"]
+            parts["neighbors"].append(chunk["neighbors"][offsets[lo]:offsets[hi]])
+            idx += 1
+        # Rows within one chunk stay memory-mapped views
+        return {name: values[0] if len(values) == 1 else np.concatenate(values)
+                for name, values in parts.items() if values}
+
+    def episode(self, idx: int):
+        """Returns the rows of episode idx, its reset row first."""
+        start, length, _ = self._index[idx]
+        return self.rows(int(start), int(start + length))
@@ -0,0 +1,150 @@
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+def rasterize_lanes(shapes: Sequence, widths: Sequence[float], resolution: float, margin: float,
+                    color: Sequence[int]=(128, 128, 128)):
+    """Draws lanes, given as (k, 2) polylines and their widths, into an
+    (H, W, 3) uint8 raster of resolution meters per pixel, covering the
+    lanes and margin meters around them.
+
+    Returns the raster and the world coordinates (x, y) of its top left
+    corner. Rows run from north to south, columns from west to east.
+    """
+    points = np.concatenate([np.asarray(shape, dtype=np.float64).reshape(-1, 2) for shape in shapes])
+    x_min, y_min = points.min(axis=0) - margin
+    x_max, y_max = points.max(axis=0) + margin
+    height = int(np.ceil((y_max - y_min) / resolution))
+    width = int(np.ceil((x_max - x_min) / resolution))
+    raster = np.zeros((height, width, 3), dtype=np.uint8)
+
+    for shape, lane_width in zip(shapes, widths):
+        shape = np.asarray(shape, dtype=np.float64).reshape(-1, 2)
+        half_width = lane_width / 2
+        for p0, p1 in zip(shape[:-1], shape[1:]):
+            # Pixels of the bounding box of the segment, drawn with round caps
+            lo = np.minimum(p0, p1) - half_width
+            hi = np.maximum(p0, p1) + half_width
+            cols = np.arange(max(int((lo[0] - x_min) / resolution), 0),
+                             min(int((hi[0] - x_min) / resolution) + 1, width))
+            rows = np.arange(max(int((y_max - hi[1]) / resolution), 0),
+                             min(int((y_max - lo[1]) / resolution) + 1, height))
+            px = x_min + (cols + 0.5) * resolution
+            py = y_max - (rows + 0.5) * resolution
+            seg = p1 - p0
+            length2 = float(seg @ seg)
+            dx = px[None, :] - p0[0]
+            dy = py[:, None] - p0[1]
+            t = np.clip((dx * seg[0] + dy * seg[1]) / length2, 0, 1) if length2 > 0 else 0.0
+            dist2 = (dx - t * seg[0]) ** 2 + (dy - t * seg[1]) ** 2
+            inside = dist2 <= half_width ** 2
+            raster[rows[:, None].repeat(len(cols), axis=1)[inside],
+                   cols[None, :].repeat(len(rows), axis=0)[inside]] = color
+    return raster, (x_min, y_max)
+
+
+class BirdsEyeRasterizer:
+    """Renders an ego-centred, north-up bird's-eye view as an (H, W, 3)
+    uint8 array.
+
+    The static part, a raster of the lanes from rasterize_lanes, is cropped
+    around the ego vehicle. Vehicles are drawn on top as oriented boxes,
+    all vehicles of a frame at once: every vehicle tests the pixels of a
+    fixed size patch around its center against its box.
+    """
+
+    def __init__(self,
+                 background: np.ndarray,
+                 origin: Sequence[float],
+                 resolution: float,
+                 size: int=84,
+                 vehicle_length: float=5.0,
+                 vehicle_width: float=1.8,
+                 ego_color: Sequence[int]=(255, 0, 0),
+                 vehicle_color: Sequence[int]=(255, 255, 0)):
+        if size < 1 or resolution <= 0:
+            raise ValueError("Image size and resolution must be greater than zero.")
+        self._background = background
+        self._origin = np.asarray(origin, dtype=np.float64)
+        self._resolution = resolution
+        self._size = size
+        self._vehicle_length = vehicle_length
+        self._vehicle_width = vehicle_width
+        self._ego_color = np.asarray(ego_color, dtype=np.uint8)
+        self._vehicle_color = np.asarray(vehicle_color, dtype=np.uint8)
+        self._frame = np.zeros((size, size, 3), dtype=np.uint8)
+        # Box extent in pixels
+        self._half_length = vehicle_length / 2 / resolution
+        self._half_width = vehicle_width / 2 / resolution
+
+        # Pixel offsets of the patch covering a box around its center
+        half = int(np.ceil(np.hypot(vehicle_length, vehicle_width) / 2 / resolution))
+        offsets = np.arange(-half, half + 1)
+        self._patch_rows = np.repeat(offsets, len(offsets))
+        self._patch_cols = np.tile(offsets, len(offsets))
+
+    @property
+    def shape(self):
+        return self._frame.shape
+
+    @property
+    def radius(self):
+        """Distance from ego beyond which vehicles can not show up in the
+        frame, given as front bumper positions."""
+        return self._size * self._resolution / np.sqrt(2) + self._vehicle_length
+
+    @property
+    def frame(self):
+        """Last rendered frame, overwritten by the next render."""
+        return self._frame
+
+    def render(self, center, positions, angles, ego_index: Optional[int]=None):
+        """Renders the view centred on center.
+
+        positions are the (N, 2) front bumper positions and angles the (N,)
+        headings in degrees, clockwise from north, as reported by SUMO.
+        The vehicle at ego_index is drawn in the ego color, on top. Returns
+        the frame buffer, which is overwritten by the next render.
+        """
+        size, res = self._size, self._resolution
+        # Top left pixel of the frame in the background, clipped to it
+        row0 = int(np.floor((self._origin[1] - center[1]) / res)) - size // 2
+        col0 = int(np.floor((center[0] - self._origin[0]) / res)) - size // 2
+        row0 = min(max(row0, 0), self._background.shape[0] - size)
+        col0 = min(max(col0, 0), self._background.shape[1] - size)
+        np.copyto(self._frame, self._background[row0:row0 + size, col0:col0 + size])
+        if len(positions) == 0:
+            return self._frame
+
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        theta = np.radians(np.asarray(angles, dtype=np.float64))
+        sin, cos = np.sin(theta), np.cos(theta)
+        # Box centers in frame pixel coordinates, rows pointing south
+        u = (positions[:, 0] - sin * (self._vehicle_length / 2) - self._origin[0]) / res - col0
+        v = (self._origin[1] - positions[:, 1] + cos * (self._vehicle_length / 2)) / res - row0
+        half = self._patch_cols[-1]
+        visible = np.flatnonzero((u > -half) & (u < size + half) & (v > -half) & (v < size + half))
+        if ego_index is not None:
+            # Drawn last, so that ego stays on top
+            visible = np.concatenate([visible[visible != ego_index], [ego_index]])
+        u, v, sin, cos = u[visible], v[visible], sin[visible], cos[visible]
+
+        # Patch pixels of every vehicle, offsets from the box center in
+        # pixels with y pointing north, projected on the box axes
+        cu, cv = np.floor(u), np.floor(v)
+        dx = self._patch_cols[None, :] + (cu + 0.5 - u)[:, None]
+        dy = -(self._patch_rows[None, :] + (cv + 0.5 - v)[:, None])
+        along = dx * sin[:, None] + dy * cos[:, None]
+        across = dy * sin[:, None] - dx * cos[:, None]
+        rows = cv.astype(np.int64)[:, None] + self._patch_rows[None, :]
+        cols = cu.astype(np.int64)[:, None] + self._patch_cols[None, :]
+        inside = ((np.abs(along) <= self._half_length) & (np.abs(across) <= self._half_width)
+                  & (rows >= 0) & (rows < size) & (cols >= 0) & (cols < size))
+
+        if ego_index is None:
+            self._frame[rows[inside], cols[inside]] = self._vehicle_color
+            return self._frame
+        self._frame[rows[:-1][inside[:-1]], cols[:-1][inside[:-1]]] = self._vehicle_color
+        self._frame[rows[-1][inside[-1]], cols[-1][inside[-1]]] = self._ego_color
+        return self._frame
@@ -0,0 +1,427 @@
+import os
+import math
+import pickle
+
+from sumo.envs.lazy import LazyModule
+
+tcc = LazyModule("traci.constants")
+
+_FORMAT = 2
+
+# Raw state of every step, by getter: vehicle and traffic light variables
+# by the name of their traci constant, simulation variables likewise.
+_VEHICLE_GETTERS = {"getPosition": "VAR_POSITION",
+                    "getSpeed": "VAR_SPEED",
+                    "getAngle": "VAR_ANGLE",
+                    "getMaxSpeed": "VAR_MAXSPEED"}
+_SIMULATION_GETTERS = {"getTime": "VAR_TIME",
+                       "getCollidingVehiclesIDList": "VAR_COLLIDING_VEHICLES_IDS",
+                       "getArrivedIDList": "VAR_ARRIVED_VEHICLES_IDS",
+                       "getDepartedIDList": "VAR_DEPARTED_VEHICLES_IDS",
+                       "getMinExpectedNumber": "VAR_MIN_EXPECTED_VEHICLES"}
+_TRAFFIC_LIGHT_GETTERS = {"getPhase": "TL_CURRENT_PHASE",
+                          "getNextSwitch": "TL_NEXT_SWITCH"}
+
+
+# Getters served from the raw state, other getters are logged as called
+_SERVED = {("vehicle", name) for name in list(_VEHICLE_GETTERS) + ["getIDList", "getNextTLS", "getSubscriptionResults",
+                                                                  "getAllSubscriptionResults",
+                                                                  "getContextSubscriptionResults"]}
+_SERVED |= {("simulation", name) for name in list(_SIMULATION_GETTERS) + ["getSubscriptionResults"]}
+_SERVED |= {("trafficlight", name) for name in list(_TRAFFIC_LIGHT_GETTERS) + ["getIDList", "getSubscriptionResults"]}
+_SERVED |= {("junction", "getPosition")}
+
+
+def _is_getter(name: str):
+    return name.startswith("get")
+
+
+def _is_subscription(name: str):
+    return name.startswith("subscribe") or name.startswith("unsubscribe")
+
+
+class _RecordingDomain:
+    """Wraps a TraCI domain, passing every call and its result to the
+    recorder."""
+
+    def __init__(self, domain, recorder, name: str):
+        self._domain = domain
+        self._recorder = recorder
+        self._name = name
+        self._wrapped = {}
+
+    def __getattr__(self, name):
+        wrapped = self._wrapped.get(name)
+        if wrapped is not None:
+            return wrapped
+        attr = getattr(self._domain, name)
+        if not callable(attr):
+            return attr
+        recorder, domain = self._recorder, self._name
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            recorder.log(domain, name, args, kwargs, result)
+            return result
+
+        self._wrapped[name] = call
+        return call
+
+
+class TraciRecorder:
+    """Wraps a TraCI connection or the libsumo module and logs what
+    TraciReplay needs to stand in for it.
+
+    Commands, every call that changes the simulation (setSpeed,
+    simulationStep, ...), are logged in order. Getters and subscriptions
+    are not: after every simulation step the raw state is logged instead,
+    ids, position, speed, heading and max speed of all vehicles,
+    collisions, arrivals, departures and the traffic lights, read through
+    one context subscription around a junction covering the whole net.
+    The next traffic lights of a vehicle are logged while it is subscribed
+    to them. Other getters are logged with the step they were called at.
+
+    The log is split in episodes, started by begin_episode. Calls made
+    outside an episode (loading a scenario, warming it up) are not logged,
+    so a replay only has to reproduce what follows. Episodes are pickled
+    to path as they end, appended to the episodes already logged there.
+    """
+
+    _domains = ("vehicle", "simulation", "trafficlight", "junction", "lane", "edge", "route", "vehicletype")
+    # Session management, never replayed
+    _ignored = ("close", "load")
+
+    def __init__(self, conn, path: str):
+        self._conn = conn
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                header = pickle.load(f)
+            if header.get("format") != _FORMAT:
+                raise ValueError("Can not append to {}, a TraCI log of format {}.".format(path,
+                                                                                         header.get("format")))
+            self._file = open(path, "ab")
+        else:
+            self._file = open(path, "wb")
+            pickle.dump({"format": _FORMAT}, self._file)
+            self._file.flush()
+        self._episode = None
+        self._anchor = None
+        self._tls_ids = ()
+        self._next_tls = set()
+        self._wrapped = {}
+
+    def __getattr__(self, name):
+        wrapped = self._wrapped.get(name)
+        if wrapped is not None:
+            return wrapped
+        if name in self._domains:
+            wrapped = _RecordingDomain(getattr(self._conn, name), self, name)
+        elif name in self._ignored:
+            return getattr(self._conn, name)
+        else:
+            wrapped = _RecordingDomain(self._conn, self, "").__getattr__(name)
+        self._wrapped[name] = wrapped
+        return wrapped
+
+    def log(self, domain: str, name: str, args, kwargs, result):
+        if self._episode is None:
+            return
+        if _is_subscription(name):
+            if domain == "vehicle" and name == "subscribe":
+                variables = args[1] if len(args) > 1 else kwargs.get("varIDs", ())
+                if tcc.VAR_NEXT_TLS in variables:
+                    # Also logged for the current step, read right away
+                    self._next_tls.add(args[0])
+                    self._episode["frames"][-1]["next_tls"][args[0]] = self._conn.vehicle.getNextTLS(args[0])
+                else:
+                    self._next_tls.discard(args[0])
+            return
+        if _is_getter(name):
+            if (domain, name) not in _SERVED:
+                self._episode["frames"][-1]["calls"][(domain, name, repr(args), repr(kwargs))] = result
+            return
+        self._episode["commands"].append((domain, name, args, tuple(sorted(kwargs.items()))))
+        if domain == "" and name == "simulationStep":
+            self._episode["frames"].append(self._snapshot())
+
+    def _snapshot(self):
+        conn = self._conn
+        ids = conn.vehicle.getIDList()
+        results = conn.junction.getContextSubscriptionResults(self._anchor)
+        vehicles = {veh_id: dict(results[veh_id]) for veh_id in ids if veh_id in results}
+        for veh_id in ids:
+            if veh_id not in vehicles:
+                # Vehicles off the lanes, e.g. inserted by the last reset
+                vehicles[veh_id] = {getattr(tcc, var): getattr(conn.vehicle, getter)(veh_id)
+                                    for getter, var in _VEHICLE_GETTERS.items()}
+        return {"ids": ids,
+                "vehicles": vehicles,
+                "next_tls": {veh_id: conn.vehicle.getNextTLS(veh_id) for veh_id in self._next_tls if veh_id in vehicles},
+                "simulation": {getattr(tcc, var): getattr(conn.simulation, getter)()
+                               for getter, var in _SIMULATION_GETTERS.items()},
+                "trafficlights": {tls_id: {getattr(tcc, var): getattr(conn.trafficlight, getter)(tls_id)
+                                           for getter, var in _TRAFFIC_LIGHT_GETTERS.items()}
+                                  for tls_id in self._tls_ids},
+                "calls": {}}
+
+    def begin_episode(self, key: str):
+        """Ends the current episode and logs the calls that follow as the
+        episode of the scenario identified by key."""
+        self.end_episode()
+        conn = self._conn
+        # Loading a scenario drops subscriptions, the anchor is subscribed
+        # to again for every episode.
+        junctions = conn.junction.getIDList()
+        (x_min, y_min), (x_max, y_max) = conn.simulation.getNetBoundary()
+        self._anchor = junctions[0]
+        conn.junction.subscribeContext(self._anchor, tcc.CMD_GET_VEHICLE_VARIABLE,
+                                       2 * math.hypot(x_max - x_min, y_max - y_min) + 1.0,
+                                       [getattr(tcc, var) for var in _VEHICLE_GETTERS.values()])
+        self._tls_ids = conn.trafficlight.getIDList()
+        self._next_tls = set()
+        self._episode = {"key": key,
+                         "junctions": {junction: conn.junction.getPosition(junction) for junction in junctions},
+                         "trafficlights": self._tls_ids,
+                         "commands": [],
+                         "frames": []}
+        self._episode["frames"].append(self._snapshot())
+
+    def end_episode(self):
+        if self._episode is not None:
+            pickle.dump(self._episode, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._file.flush()
+        self._episode = None
+
+    def stop(self):
+        """Writes the current episode and closes the log."""
+        if not self._file.closed:
+            self.end_episode()
+            self._file.close()
+
+
+class _ReplayDomain:
+    def __init__(self, replay, name: str):
+        self._replay = replay
+        self._name = name
+
+    def __getattr__(self, name):
+        replay, domain = self._replay, self._name
+
+        def call(*args, **kwargs):
+            return replay.call(domain, name, args, kwargs)
+
+        setattr(self, name, call)
+        return call
+
+
+class TraciReplay:
+    """Stands in for a TraCI connection, serving an episode logged by a
+    TraciRecorder without SUMO.
+
+    Episodes are replayed in the order they were recorded, from the
+    start-th on. Commands must match the logged ones, method and
+    arguments, otherwise the replay has diverged from the recording
+    (different seeds, actions or control code) and a RuntimeError is
+    raised. Getters and subscription results are served from the logged
+    state of the current step, whatever the order they are called in, so
+    the observation code (obs backend, view size, obs mode) can differ
+    from the one of the recording. Logs are pickles, only replay logs you
+    trust.
+    """
+
+    def __init__(self, path: str, start: int=0):
+        self._path = path
+        self._file = open(path, "rb")
+        header = pickle.load(self._file)
+        if header.get("format") != _FORMAT:
+            raise ValueError("Unsupported TraCI log format: {}.".format(header.get("format")))
+        self._episode = -1
+        self._log = None
+        self._frame = None
+        self._step = 0
+        self._pos = 0
+        self._domains = {}
+        # Subscriptions, by object id in the order they were made
+        self._vehicle_subscriptions = {}
+        self._context_subscriptions = {}
+        self._trafficlight_subscriptions = {}
+        self._simulation_variables = ()
+        for _ in range(start):
+            self._next_episode()
+
+    @property
+    def next_episode(self):
+        """Index of the episode the next begin_episode replays."""
+        return self._episode + 1
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in TraciRecorder._domains:
+            domain = self._domains.get(name)
+            if domain is None:
+                domain = self._domains[name] = _ReplayDomain(self, name)
+            return domain
+
+        def call(*args, **kwargs):
+            return self.call("", name, args, kwargs)
+
+        return call
+
+    def _next_episode(self):
+        self._episode += 1
+        try:
+            return pickle.load(self._file)
+        except EOFError:
+            raise RuntimeError("{} holds {} episodes, no more to replay.".format(self._path, self._episode))
+
+    def begin_episode(self, key: str):
+        """Moves to the next recorded episode, which must be of the
+        scenario identified by key."""
+        episode = self._next_episode()
+        if episode["key"] != key:
+            raise RuntimeError("Replay diverged at episode {}: scenario differs from the recording.".format(self._episode))
+        self._log = episode
+        self._step = 0
+        self._frame = episode["frames"][0]
+        self._pos = 0
+        # Loading a scenario drops all subscriptions
+        self._vehicle_subscriptions = {}
+        self._context_subscriptions = {}
+        self._trafficlight_subscriptions = {}
+        self._simulation_variables = ()
+
+    def call(self, domain: str, name: str, args, kwargs):
+        if self._log is None:
+            raise RuntimeError("Replay has no episode, call begin_episode first.")
+        if _is_subscription(name):
+            return self._subscribe(domain, name, args, kwargs)
+        if _is_getter(name):
+            return self._get(domain, name, args, kwargs)
+
+        kwargs = tuple(sorted(kwargs.items()))
+        commands = self._log["commands"]
+        if self._pos < len(commands):
+            logged = commands[self._pos]
+            if logged == (domain, name, args, kwargs):
+                self._pos += 1
+                if domain == "" and name == "simulationStep":
+                    self._advance()
+                return None
+            expected = "{}({})".format(".".join(filter(None, logged[:2])), logged[2])
+        else:
+            expected = "end of episode"
+        raise RuntimeError("Replay diverged at command {} of episode {}: got {}({}), expected {}.".format(
+            self._pos, self._episode, ".".join(filter(None, (domain, name))), args, expected))
+
+    def _advance(self):
+        self._step += 1
+        self._frame = self._log["frames"][self._step]
+        # Subscriptions end when their vehicle leaves the simulation
+        vehicles = self._frame["vehicles"]
+        for subscriptions in (self._vehicle_subscriptions, self._context_subscriptions):
+            for veh_id in [veh_id for veh_id in subscriptions if veh_id not in vehicles]:
+                del subscriptions[veh_id]
+
+    def _subscribe(self, domain: str, name: str, args, kwargs):
+        def arg(index, keyword, default=None):
+            return args[index] if len(args) > index else kwargs.get(keyword, default)
+
+        if domain == "vehicle" and name == "subscribe":
+            # Subscribing again replaces the variables, code relying on
+            # SUMO versions which add them up fails here instead of live.
+            self._vehicle_subscriptions[arg(0, "objectID")] = tuple(arg(1, "varIDs", ()))
+        elif domain == "vehicle" and name == "unsubscribe":
+            self._vehicle_subscriptions.pop(arg(0, "objectID"), None)
+        elif domain == "vehicle" and name == "subscribeContext":
+            if arg(1, "domain") != tcc.CMD_GET_VEHICLE_VARIABLE:
+                raise RuntimeError("Replay only serves vehicle contexts of vehicles.")
+            self._context_subscriptions[arg(0, "objectID")] = (arg(2, "dist"), tuple(arg(3, "varIDs", ())))
+        elif domain == "vehicle" and name == "unsubscribeContext":
+            self._context_subscriptions.pop(arg(0, "objectID"), None)
+        elif domain == "simulation" and name == "subscribe":
+            self._simulation_variables = tuple(arg(0, "varIDs", ()))
+        elif domain == "trafficlight" and name == "subscribe":
+            self._trafficlight_subscriptions[arg(0, "objectID")] = tuple(arg(1, "varIDs", ()))
+        else:
+            raise RuntimeError("Replay does not serve {}.{}.".format(domain, name))
+        return None
+
+    def _missing(self, what):
+        return RuntimeError("Replay diverged at step {} of episode {}: {} was not recorded.".format(
+            self._step, self._episode, what))
+
+    def _vehicle_values(self, veh_id: str, variables):
+        values = self._frame["vehicles"].get(veh_id)
+        if values is None:
+            raise self._missing("vehicle {!r}".format(veh_id))
+        out = {}
+        for var in variables:
+            if var == tcc.VAR_NEXT_TLS:
+                if veh_id not in self._frame["next_tls"]:
+                    raise self._missing("the next traffic lights of {!r}".format(veh_id))
+                out[var] = self._frame["next_tls"][veh_id]
+            elif var in values:
+                out[var] = values[var]
+            else:
+                raise self._missing("variable {:#x} of {!r}".format(var, veh_id))
+        return out
+
+    def _get(self, domain: str, name: str, args, kwargs):
+        frame = self._frame
+        if domain == "vehicle":
+            if name == "getIDList":
+                return frame["ids"]
+            if name in _VEHICLE_GETTERS:
+                var = getattr(tcc, _VEHICLE_GETTERS[name])
+                return self._vehicle_values(args[0], (var,))[var]
+            if name == "getNextTLS":
+                return self._vehicle_values(args[0], (tcc.VAR_NEXT_TLS,))[tcc.VAR_NEXT_TLS]
+            if name == "getSubscriptionResults":
+                variables = self._vehicle_subscriptions.get(args[0])
+                return {} if variables is None else self._vehicle_values(args[0], variables)
+            if name == "getAllSubscriptionResults":
+                return {veh_id: self._vehicle_values(veh_id, variables)
+                        for veh_id, variables in self._vehicle_subscriptions.items()}
+            if name == "getContextSubscriptionResults":
+                return self._context_results(args[0])
+        elif domain == "simulation":
+            if name in _SIMULATION_GETTERS:
+                return frame["simulation"][getattr(tcc, _SIMULATION_GETTERS[name])]
+            if name == "getSubscriptionResults":
+                return {var: frame["simulation"][var] for var in self._simulation_variables}
+        elif domain == "trafficlight":
+            if name == "getIDList":
+                return self._log["trafficlights"]
+            if name in _TRAFFIC_LIGHT_GETTERS:
+                return frame["trafficlights"][args[0]][getattr(tcc, _TRAFFIC_LIGHT_GETTERS[name])]
+            if name == "getSubscriptionResults":
+                variables = self._trafficlight_subscriptions.get(args[0], ())
+                return {var: frame["trafficlights"][args[0]][var] for var in variables}
+        elif domain == "junction" and name == "getPosition":
+            if args[0] in self._log["junctions"]:
+                return self._log["junctions"][args[0]]
+
+        key = (domain, name, repr(args), repr(kwargs))
+        if key not in frame["calls"]:
+            raise self._missing("{}({})".format(".".join(filter(None, (domain, name))), args))
+        return frame["calls"][key]
+
+    def _context_results(self, veh_id: str):
+        """Vehicles within the subscribed distance of veh_id, measured
+        between front bumpers and sorted by id, as SUMO does."""
+        subscription = self._context_subscriptions.get(veh_id)
+        vehicles = self._frame["vehicles"]
+        if subscription is None or veh_id not in vehicles:
+            return {}
+        dist, variables = subscription
+        x, y = vehicles[veh_id][tcc.VAR_POSITION]
+        results = {}
+        for other in sorted(vehicles):
+            other_x, other_y = vehicles[other][tcc.VAR_POSITION]
+            if math.sqrt((other_x - x) ** 2 + (other_y - y) ** 2) <= dist:
+                results[other] = self._vehicle_values(other, variables)
+        return results
+
+    def close(self):
+        self._file.close()
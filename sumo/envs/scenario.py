@@ -0,0 +1,92 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import collections
+from typing import Callable, Optional
+
+
+def default_workspace_root():
+    """RAM-backed /dev/shm when writable, the system temp directory otherwise."""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+class ScenarioCache:
+    """On-disk cache of generated SUMO scenarios.
+
+    A scenario is identified by a hash of the parameters it is generated
+    from. Each distinct scenario is written once into a directory named
+    after its hash under root, later lookups just return that directory.
+    Directories are written to a temporary location and renamed into
+    place, so several processes can share a cache root safely.
+
+    With max_scenarios, the directories of the least recently used
+    scenarios are removed once more are held, which keeps random traffic,
+    a new scenario on almost every reset, from filling the disk. Evicting
+    caches must not share their root with other processes.
+    """
+
+    def __init__(self, root: str, max_scenarios: Optional[int]=None):
+        if max_scenarios is not None and max_scenarios < 1:
+            raise ValueError("Max scenarios must be greater than zero.")
+        self._root = root
+        self._max_scenarios = max_scenarios
+        # key -> directory, least recently used first
+        self._paths = collections.OrderedDict()
+        self._evictions = 0
+
+    @property
+    def root(self):
+        return self._root
+
+    def __len__(self):
+        return len(self._paths)
+
+    def stats(self):
+        return {"scenarios": len(self._paths),
+                "evictions": self._evictions}
+
+    @staticmethod
+    def key(params: dict):
+        """Hash of the JSON serializable scenario parameters."""
+        data = json.dumps(params, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    def get(self, params: dict, write_fn: Callable[[str], None]):
+        """Returns the directory of the scenario described by params.
+
+        write_fn(path) is called to write the scenario files into path if
+        the scenario is not cached yet.
+        """
+        key = self.key(params)
+        path = self._paths.get(key)
+        if path is not None:
+            self._paths.move_to_end(key)
+            return path
+
+        path = os.path.join(self._root, key)
+        if not os.path.isdir(path):
+            os.makedirs(self._root, exist_ok=True)
+            tmpPath = tempfile.mkdtemp(prefix=".tmp-", dir=self._root)
+            try:
+                write_fn(tmpPath)
+                os.rename(tmpPath, path)
+            except OSError:
+                # Another process materialized the same scenario first
+                if not os.path.isdir(path):
+                    raise
+            finally:
+                if os.path.isdir(tmpPath):
+                    shutil.rmtree(tmpPath)
+        self._paths[key] = path
+        self._evict()
+        return path
+
+    def _evict(self):
+        while self._max_scenarios is not None and len(self._paths) > self._max_scenarios:
+            _, path = self._paths.popitem(last=False)
+            shutil.rmtree(path, ignore_errors=True)
+            self._evictions += 1
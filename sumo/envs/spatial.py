@@ -0,0 +1,96 @@
+import numpy as np
+
+
+class UniformGridIndex:
+    """Uniform grid over 2D vehicle positions.
+
+    The index is rebuilt from scratch on every call to `build` with a
+    single vectorized sort of cell keys, which is cheap next to fetching
+    the positions from SUMO. Radius and k-nearest queries then only visit
+    the cells overlapping the query, so their cost depends on the local
+    density instead of the total number of vehicles.
+    """
+
+    def __init__(self, cell_size: float):
+        if cell_size <= 0:
+            raise ValueError("Cell size must be greater than zero.")
+        self._cell_size = float(cell_size)
+        self._positions = np.zeros((0, 2), dtype=np.float64)
+        self._order = np.zeros(0, dtype=np.int64)
+        self._sorted_keys = np.zeros(0, dtype=np.int64)
+        self._min_cell = np.zeros(2, dtype=np.int64)
+        self._num_cells = np.zeros(2, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._positions)
+
+    @property
+    def positions(self):
+        return self._positions
+
+    def build(self, positions):
+        """Indexes positions, an (N, 2) array. The array is referenced, not copied."""
+        self._positions = positions
+        if len(positions) == 0:
+            self._order = np.zeros(0, dtype=np.int64)
+            self._sorted_keys = np.zeros(0, dtype=np.int64)
+            return
+        cells = np.floor(positions / self._cell_size).astype(np.int64)
+        self._min_cell = cells.min(axis=0)
+        self._num_cells = cells.max(axis=0) - self._min_cell + 1
+        cells -= self._min_cell
+        keys = cells[:, 0] * self._num_cells[1] + cells[:, 1]
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+
+    def _candidates(self, point, radius: float):
+        """Indices of all vehicles in cells overlapping the query square."""
+        if len(self._positions) == 0:
+            return self._order
+        lo = np.floor((np.asarray(point) - radius) / self._cell_size).astype(np.int64) - self._min_cell
+        hi = np.floor((np.asarray(point) + radius) / self._cell_size).astype(np.int64) - self._min_cell
+        lo = np.maximum(lo, 0)
+        hi = np.minimum(hi, self._num_cells - 1)
+        if np.any(lo > hi):
+            return self._order[:0]
+        # Cells of one grid column are contiguous in key space.
+        columns = np.arange(lo[0], hi[0] + 1)
+        starts = np.searchsorted(self._sorted_keys, columns * self._num_cells[1] + lo[1], side="left")
+        ends = np.searchsorted(self._sorted_keys, columns * self._num_cells[1] + hi[1], side="right")
+        if len(columns) == 1:
+            return self._order[starts[0]:ends[0]]
+        return np.concatenate([self._order[s:e] for s, e in zip(starts, ends)])
+
+    def query_radius(self, point, radius: float):
+        """Returns indices, in ascending order, of positions within radius of point."""
+        candidates = self._candidates(point, radius)
+        delta = self._positions[candidates] - point
+        dist = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+        return np.sort(candidates[dist <= radius])
+
+    def query_knn(self, point, k: int, max_radius: float=float("inf")):
+        """Returns indices of the k positions nearest to point, nearest first.
+
+        Only positions within max_radius are considered, so fewer than k
+        indices may be returned.
+        """
+        if k <= 0 or len(self._positions) == 0:
+            return self._order[:0]
+        # Grow the search square until it holds k positions within its
+        # inscribed circle, those are then guaranteed to be the k nearest.
+        radius = min(self._cell_size, max_radius)
+        while True:
+            candidates = np.sort(self._candidates(point, radius))
+            delta = self._positions[candidates] - point
+            dist = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+            inside = dist <= radius
+            if np.count_nonzero(inside) >= k or radius >= max_radius:
+                break
+            if len(candidates) == len(self._positions):
+                inside = dist <= max_radius
+                break
+            radius = min(2 * radius, max_radius)
+        candidates = candidates[inside]
+        dist = dist[inside]
+        nearest = np.argsort(dist, kind="stable")[:k]
+        return candidates[nearest]
@@ -0,0 +1,125 @@
+from typing import Dict, Optional, Sequence
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+
+
+class TrafficGenerator:
+    """Parametric traffic of the V2I scenario.
+
+    Generates num_vehicles vehicles, the ego vehicle being the ego_index-th
+    to depart (num_vehicles // 2 by default), on the routes of the bundled
+    route file:
+
+    * depart_rate: all vehicles depart at 0.0 if None, otherwise departs
+      follow a Poisson process with depart_rate vehicles per second.
+    * route_mix: {route: weight} routes are drawn from. If None, vehicles
+      other than ego alternate between r_0 and r_1.
+    * vtypes: vehicle types of vehicles other than ego, dicts with an "id",
+      an optional "weight" and SUMO vType attributes. If None, they use
+      the default non ego vType.
+
+    The defaults give the traffic V2I always had. Random choices are drawn
+    from the env's np_random, after the ego route. Route files are written
+    line by line, without building an XML tree.
+    """
+
+    routes = ("r_0", "r_1")
+
+    def __init__(self,
+                 num_vehicles: int=50,
+                 ego_index: Optional[int]=None,
+                 depart_rate: Optional[float]=None,
+                 route_mix: Optional[Dict[str, float]]=None,
+                 vtypes: Optional[Sequence[dict]]=None):
+        if num_vehicles < 1:
+            raise ValueError("Number of vehicles must be greater than zero.")
+        ego_index = num_vehicles // 2 if ego_index is None else ego_index
+        if ego_index < 0 or ego_index >= num_vehicles:
+            raise ValueError("Ego index must be in [0, {}], Got: {}.".format(num_vehicles - 1, ego_index))
+        if depart_rate is not None and depart_rate <= 0:
+            raise ValueError("Depart rate must be greater than zero.")
+        if route_mix is not None:
+            for route in route_mix:
+                if route not in self.routes:
+                    raise ValueError("Invalid route: {}, Expected one of {}.".format(route, self.routes))
+        if vtypes is not None:
+            if len(vtypes) == 0 or any("id" not in vtype for vtype in vtypes):
+                raise ValueError("Expected vtypes with an id each.")
+            if any(vtype["id"] == "ego_vType" for vtype in vtypes):
+                raise ValueError("The ego_vType id is reserved for the ego vehicle.")
+
+        self._num_vehicles = num_vehicles
+        self._ego_index = ego_index
+        self._depart_rate = depart_rate
+        self._route_mix = dict(route_mix) if route_mix is not None else None
+        self._vtypes = [dict(vtype) for vtype in vtypes] if vtypes is not None else None
+
+    @property
+    def num_vehicles(self):
+        return self._num_vehicles
+
+    @property
+    def ego_index(self):
+        return self._ego_index
+
+    @property
+    def vtypes(self):
+        """vType attributes of vehicles other than ego, None for the default."""
+        if self._vtypes is None:
+            return None
+        return [{k: v for k, v in vtype.items() if k != "weight"} for vtype in self._vtypes]
+
+    def generate(self, np_random: np.random.Generator, ego_route: str):
+        """Returns (id, vType, route, depart) of every vehicle, sorted by
+        depart."""
+        n = self._num_vehicles
+        others = n - 1
+
+        if self._vtypes is None:
+            types = ["non_ego_vType"] * others
+        else:
+            weights = np.array([vtype.get("weight", 1.0) for vtype in self._vtypes], dtype=np.float64)
+            choice = np_random.choice(len(self._vtypes), size=others, p=weights / weights.sum())
+            types = [self._vtypes[idx]["id"] for idx in choice]
+
+        if self._route_mix is None:
+            routes = [self.routes[idx % 2] for idx in range(others)]
+        else:
+            names = list(self._route_mix)
+            weights = np.array([self._route_mix[name] for name in names], dtype=np.float64)
+            routes = [names[idx] for idx in np_random.choice(len(names), size=others, p=weights / weights.sum())]
+
+        if self._depart_rate is None:
+            departs = ["0.0"] * n
+        else:
+            times = np.cumsum(np_random.exponential(1.0 / self._depart_rate, size=n))
+            departs = ["{:.2f}".format(t) for t in times]
+
+        vehicles = []
+        other = 0
+        for idx in range(n):
+            if idx == self._ego_index:
+                vehicles.append(("ego", "ego_vType", ego_route, departs[idx]))
+            else:
+                vehicles.append(("car_" + str(idx), types[other], routes[other], departs[idx]))
+                other += 1
+        return vehicles
+
+    @staticmethod
+    def write_routes(path: str, route_defs: Sequence[bytes], vtypes: Sequence[dict], vehicles):
+        """Streams a route file with the given route definitions (serialized
+        <route> elements), vTypes and vehicles."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("<?xml version='1.0' encoding='utf-8'?>\n<routes>\n")
+            for route in route_defs:
+                f.write("  ")
+                f.write(route.decode("utf-8").strip())
+                f.write("\n")
+            for vtype in vtypes:
+                attrs = " ".join("{}={}".format(k, quoteattr(str(v))) for k, v in vtype.items())
+                f.write("  <vType {}/>\n".format(attrs))
+            line = '  <vehicle id="{}" depart="{}" type={} route="{}"/>\n'
+            f.writelines(line.format(veh_id, depart, quoteattr(vtype), route)
+                         for veh_id, vtype, route, depart in vehicles)
+            f.write("</routes>\n")
@@ -2,31 +2,128 @@ import os
 import sys
 import pathlib
 import base64
+import shutil
+import hashlib
 import logging
-import traci as tc
+import tempfile
+import weakref
+import functools
+import collections
 import numpy as np
-from lxml import etree
 import gymnasium as gym
 from gymnasium.spaces.box import Box
 from gymnasium.spaces import Sequence
-from scipy.spatial import distance
-from collections import namedtuple
 from gymnasium import spaces
-from typing import Any, Union, Literal
-from sumo.xmls.defaultXMLs import ROUTE_XML, NET_XML
+from typing import Any, Hashable, Union, Literal, Optional
+from sumo.envs.lazy import LazyModule
+from sumo.envs.observation import NearbyObservationBuilder
+from sumo.envs.spatial import UniformGridIndex
+from sumo.envs.scenario import ScenarioCache, default_workspace_root
+from sumo.envs.pool import SumoServerPool
+from sumo.envs.traffic import TrafficGenerator
+from sumo.envs.recording import TrajectoryWriter, trajectory_columns
+from sumo.envs.replay import TraciRecorder, TraciReplay
+from sumo.envs.v2x import V2XChannel
+from sumo.envs.checkpoint import CheckpointCache
+from sumo.envs.rendering import BirdsEyeRasterizer, rasterize_lanes
+from sumo.envs.profiling import Profiler, NullProfiler, CountingConnection
+
+# Imported on first use, which keeps importing the package and
+# constructing envs cheap.
+traci = LazyModule("traci")
+tcc = LazyModule("traci.constants")
+etree = LazyModule("lxml.etree")
+
+# libsumo runs a single simulation per process, owned by at most one env
+_libsumo_owner = None
+
+
+@functools.lru_cache(maxsize=None)
+def _scenario_source():
+    """Hash of the bundled route and net XMLs."""
+    from sumo.xmls.defaultXMLs import ROUTE_XML, NET_XML
+    return hashlib.sha1((ROUTE_XML + NET_XML).encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _route_template():
+    """Bundled route XML, decoded once per process."""
+    from sumo.xmls.defaultXMLs import ROUTE_XML
+    return base64.b64decode(ROUTE_XML)
+
+
+@functools.lru_cache(maxsize=None)
+def _route_defs():
+    """Serialized <route> elements of the bundled route XML."""
+    routeRoot = etree.fromstring(_route_template())
+    return tuple(etree.tostring(route, encoding="utf-8", with_tail=False) for route in routeRoot.iter("route"))
+
+
+@functools.lru_cache(maxsize=None)
+def _net_file():
+    """Net file written into every scenario, built once per process."""
+    from sumo.xmls.defaultXMLs import NET_XML
+    netRoot = etree.fromstring(base64.b64decode(NET_XML))
+    return etree.tostring(netRoot, encoding="utf-8", xml_declaration=True, pretty_print=True)
+
+
+@functools.lru_cache(maxsize=None)
+def _net_lanes():
+    """Shapes and widths of all lanes of the bundled net, internal lanes
+    across junctions included."""
+    netRoot = etree.fromstring(_net_file())
+    shapes, widths = [], []
+    for lane in netRoot.iter("lane"):
+        shapes.append(tuple(tuple(map(float, point.split(","))) for point in lane.get("shape").split()))
+        # SUMO's default lane width
+        widths.append(float(lane.get("width", 3.2)))
+    return tuple(shapes), tuple(widths)
+
+
+@functools.lru_cache(maxsize=None)
+def _net_background(resolution: float, margin: float):
+    """Lane raster of the bundled net and its origin, drawn once per
+    process and resolution and shared by all renderers."""
+    shapes, widths = _net_lanes()
+    background, origin = rasterize_lanes(shapes, widths, resolution, margin)
+    background.flags.writeable = False
+    return background, origin
 
-Vehicle = namedtuple("Vehicle", ["id",
-                                 "x",
-                                 "y",
-                                 "speed"])
 
 class V2I(gym.Env):
-    metadata = {"render_modes": ["human"]}
+    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 10}
+    obs_backends = ("polling", "subscription", "grid")
+    obs_modes = ("vector", "image")
+    sumo_backends = ("traci", "libsumo", "replay")
+    reset_modes = ("load", "snapshot", "soft")
+    # Traffic light observation, link states are encoded as green 1,
+    # yellow 0.5 and red (or off) 0.
+    _tls_obs_fields = ("state", "time_to_switch", "distance")
+    _tls_state_codes = {"G": 1.0, "g": 1.0, "y": 0.5, "Y": 0.5}
     
     def __init__(self,
                  view_size: int=20,
                  max_nearby_vehicles:int=6,
-                 render_mode=None):
+                 render_mode=None,
+                 obs_backend: Literal["polling", "subscription", "grid"]="polling",
+                 label: str="default",
+                 sumo_backend: Literal["traci", "libsumo", "replay"]="traci",
+                 reset_mode: Literal["load", "snapshot", "soft"]="load",
+                 action_repeat: int=1,
+                 profile: bool=False,
+                 num_vehicles: int=50,
+                 traffic: Optional[TrafficGenerator]=None,
+                 workspace_dir: Optional[str]=None,
+                 max_scenarios: int=64,
+                 server_pool: Optional[SumoServerPool]=None,
+                 record_dir: Optional[str]=None,
+                 replay_dir: Optional[str]=None,
+                 v2x: Optional[V2XChannel]=None,
+                 num_traffic_lights: int=0,
+                 checkpoints: Optional[CheckpointCache]=None,
+                 obs_mode: Literal["vector", "image"]="vector",
+                 image_size: int=84,
+                 meters_per_pixel: float=0.5):
         
 
         #self.observation_space = spaces.Box()
@@ -35,15 +132,115 @@ class V2I(gym.Env):
         if view_size < 0:
             raise ValueError("View Size must be greater than zero.")
 
+        if action_repeat < 1:
+            raise ValueError("Action repeat must be greater than zero.")
+
+        if num_traffic_lights < 0:
+            raise ValueError("Number of traffic lights must not be negative.")
+
+        if num_vehicles < 1:
+            raise ValueError("Number of vehicles must be greater than zero.")
+
+        if image_size < 1 or meters_per_pixel <= 0:
+            raise ValueError("Image size and meters per pixel must be greater than zero.")
+
+        # Number of simulation steps every action is applied for
+        self._action_repeat = action_repeat
+
+        # Per-phase timers and SUMO call counters, see profile_summary
+        self._profiler = Profiler() if profile else NullProfiler()
+
         self._view_size = view_size
 
+        # How nearby vehicles are fetched from SUMO.
+        # polling: one getPosition/getSpeed round trip per vehicle.
+        # subscription: context subscription on ego, results arrive with simulationStep.
+        # grid: subscription on every vehicle, neighbours are queried from a spatial index.
+        if obs_backend not in self.obs_backends:
+            raise ValueError("Invalid obs backend: {}, Expected one of {}.".format(obs_backend,
+                                                                                   self.obs_backends))
+        self._obs_backend = obs_backend
+
+        # Nearby vehicles are observed through the beacons ego receives
+        # instead of ground truth, see V2XChannel.
+        if v2x is not None and obs_backend != "grid":
+            raise ValueError("V2X messaging requires the grid obs backend.")
+        self._v2x = v2x
+
+        # TraCI connection label. Every instance living in the same process
+        # needs a distinct label.
+        self._label = label
+        self._tc = None
+
         # For logging purposes
         self._logger = logging.getLogger(__name__)
-        self._logger.setLevel(logging.DEBUG)
-        logging.basicConfig(filename='output.log', level=logging.INFO)
         
-        self._logger.info("Config: View Size: {}. Max nearby vehicles to consider: {}.".format(view_size,
-                                                                                               max_nearby_vehicles))
+        self._logger.info("Config: View Size: {}. Max nearby vehicles to consider: {}. Obs backend: {}.".format(view_size,
+                                                                                                                max_nearby_vehicles,
+                                                                                                                obs_backend))
+
+        # traci talks to a SUMO process over a socket, libsumo runs SUMO
+        # in-process with the same API. libsumo cannot drive sumo-gui and
+        # supports a single simulation per process. replay serves the TraCI
+        # responses logged into replay_dir by an earlier run, without SUMO.
+        if sumo_backend not in self.sumo_backends:
+            raise ValueError("Invalid sumo backend: {}, Expected one of {}.".format(sumo_backend,
+                                                                                    self.sumo_backends))
+        if sumo_backend == "libsumo" and render_mode == "human":
+            self._logger.warning("libsumo does not support sumo-gui, falling back to traci.")
+            sumo_backend = "traci"
+        if sumo_backend == "replay" and (replay_dir is None or render_mode == "human"):
+            raise ValueError("The replay backend requires a replay_dir and no rendering.")
+        self._sumo_backend = sumo_backend
+
+        # TraCI calls and responses are logged into replay_dir/<label>.traci
+        # by the traci and libsumo backends, see TraciRecorder.
+        self._replay_dir = replay_dir
+        self._traci_log = None
+        # Episodes replayed by earlier connections, logs are appended to
+        self._replay_start = 0
+
+        # SUMO servers can be leased from a pool instead of being started
+        # by this instance, close hands them back.
+        if server_pool is not None and (sumo_backend != "traci" or render_mode == "human"):
+            raise ValueError("Server pools require the traci backend without rendering.")
+        self._server_pool = server_pool
+        self._pool_conn = None
+        # A TraCI server which loaded a state keeps part of it across load,
+        # see _start_episode.
+        self._state_loaded = False
+
+        # Episodes are recorded into record_dir/<label>, see TrajectoryReader
+        self._record_dir = record_dir
+        self._recorder = None
+        self._obs_ref = None
+
+        # Checkpoints taken by fork, see restore. Branches would break the
+        # order of recorded steps and logged TraCI calls.
+        if checkpoints is not None and (sumo_backend == "replay" or replay_dir is not None or record_dir is not None):
+            raise ValueError("Checkpoints can not be combined with recording or replaying.")
+        self._checkpoints = checkpoints
+        # Parameters of the loaded scenario, see _get_scenario_params
+        self._scenario_params = None
+
+        # How reset brings the simulation to the first step of an episode.
+        # load: loads the scenario and steps until the ego vehicle departs.
+        # snapshot: the state after warm-up is saved once per scenario and
+        # later resets load it directly, skipping the warm-up.
+        # soft: the vehicles after warm-up are recorded once per scenario,
+        # later resets keep the loaded network and re-insert them.
+        if reset_mode not in self.reset_modes:
+            raise ValueError("Invalid reset mode: {}, Expected one of {}.".format(reset_mode,
+                                                                                  self.reset_modes))
+        self._reset_mode = reset_mode
+        if max_scenarios < 1:
+            raise ValueError("Max scenarios must be greater than zero.")
+        self._max_scenarios = max_scenarios
+        # Fleets of soft resets by scenario key, least recently used first
+        self._soft_states = collections.OrderedDict()
+        self._soft_unlisted = ()
+        # (id, depart) of the vehicles of the episode yet to depart
+        self._soft_future = ()
         # Try to fetch the module path to build the sumo path
         basePath = pathlib.Path(__file__)
         binsPath = os.path.abspath(os.path.join(basePath.parent, "bins"))
@@ -51,6 +248,26 @@ class V2I(gym.Env):
         assert render_mode is None or render_mode in self.metadata["render_modes"]
         self.render_mode = render_mode
 
+        # vector: nearby vehicles (and traffic lights) as features.
+        # image: the ego-centred bird's-eye view of render_mode="rgb_array",
+        # image_size pixels square at meters_per_pixel, see BirdsEyeRasterizer.
+        if obs_mode not in self.obs_modes:
+            raise ValueError("Invalid obs mode: {}, Expected one of {}.".format(obs_mode, self.obs_modes))
+        if obs_mode == "image" and (v2x is not None or num_traffic_lights):
+            raise ValueError("V2X messaging and traffic light observations require the vector obs mode.")
+        if obs_mode == "image" and obs_backend != "polling":
+            raise ValueError("Image observations are read from the ego context subscription and do not use "
+                             "an obs backend, Got: {}.".format(obs_backend))
+        self._obs_mode = obs_mode
+        if obs_mode == "image":
+            # Frames and the count of nearby vehicles come from the ego
+            # context subscription of the renderer, nothing else is fetched.
+            self._obs_backend = "subscription"
+        self._image_size = image_size
+        self._meters_per_pixel = meters_per_pixel
+        self._renders = render_mode == "rgb_array" or obs_mode == "image"
+        self._renderer = None
+
         # Time step duration
         self._t_step = 0.1
 
@@ -60,8 +277,30 @@ class V2I(gym.Env):
         # Max number of vehicles to consider near EGO vehicle
         self._max_nearby_vehicles = max_nearby_vehicles
 
+        # Upcoming traffic lights observed after the nearby vehicles, each
+        # as (ego link state, phase, time to next switch, distance to stop
+        # line). All values arrive with subscriptions.
+        self._num_traffic_lights = num_traffic_lights
+        self._tls_ids = None
+
         # Current time steps
         self._current_t_steps = 0
+        self._ego_collided = False
+
+        # Preallocated buffers for building observations
+        self._obs_builder = NearbyObservationBuilder(view_size=view_size,
+                                                     max_nearby_vehicles=max_nearby_vehicles)
+
+        # Spatial index over all vehicles, used by the grid backend
+        self._vehicle_index = UniformGridIndex(cell_size=max(view_size, 1))
+        self._vehicle_ids = []
+        self._reset_vehicle_ids = None
+        self._vehicle_speeds = np.zeros(0, dtype=np.float64)
+
+        # Vehicles in the scene, their routes, departs and vTypes. A
+        # traffic generator replaces num_vehicles.
+        self._traffic = traffic if traffic is not None else TrafficGenerator(num_vehicles=num_vehicles)
+        self._num_vehicles = self._traffic.num_vehicles
 
         # Common vehicle config
         self._vehicle_config = {
@@ -72,15 +311,25 @@ class V2I(gym.Env):
             'minGap': 1,                  # MinGap between vehicles im metre
         }
 
+        # Generated scenario files live in a private workspace of this
+        # instance, created on first reset and removed on close. The
+        # max_scenarios most recently used scenarios are kept.
+        self._workspace_root = workspace_dir or default_workspace_root()
+        self._workspace = None
+        self._scenario_cache = None
+
         # Define action space
         self.action_space = Box(low=self._vehicle_config['maxDecel'],
                                 high=self._vehicle_config['maxAccel'],
                                 dtype=np.float32)
         
         # Define observation space
-        obs_box = Box(low=np.array([-float('inf')] * max_nearby_vehicles * 3),
-                      high=np.array([float('inf')] * max_nearby_vehicles * 3),
+        obs_size = max_nearby_vehicles * 3 + num_traffic_lights * len(self._tls_obs_fields)
+        obs_box = Box(low=np.array([-float('inf')] * obs_size),
+                      high=np.array([float('inf')] * obs_size),
                       dtype=np.float32)
+        if obs_mode == "image":
+            obs_box = Box(low=0, high=255, shape=(image_size, image_size, 3), dtype=np.uint8)
         self.observation_space = obs_box
         """
         # Simulation binary arguments
@@ -101,106 +350,133 @@ class V2I(gym.Env):
 
     def _build_sim_args(self,
                         sumoConfig,
-                        t_step):
-        return ["-c", sumoConfig,
+                        t_step,
+                        statePath=None):
+        args = ["-c", sumoConfig,
                 "--step-length", str(t_step),
                 "--collision.mingap-factor", "0",
                 "--collision.action", "warn",
                 "--xml-validation",  "never",
                 "--time-to-teleport", "-1"]
+        if self._reset_mode == "snapshot" or self._checkpoints is not None:
+            # Saved states must restore the simulation exactly
+            args += ["--save-state.rng", "--save-state.precision", "17"]
+        if statePath is not None:
+            # Vehicles are restored from the state, loading the route files
+            # as well would insert the arrived ones a second time.
+            args += ["--route-files", "", "--load-state", statePath]
+        elif self._reset_mode == "soft":
+            # All vehicles are loaded up front, soft resets reschedule the
+            # ones yet to depart and SUMO must not load them a second time.
+            args += ["--route-steps", "0"]
+        return args
     
-    def _build_VType_node(self,
-                          id,
-                          length,
-                          maxSpeed,
-                          maxAccel,
-                          maxDecel,
-                          minGap,
-                          color):
-        args = locals()
-        vType = etree.Element("vType")
-        for attrb in args:
-            if attrb != "self":
-                vType.set(attrb, str(args[attrb]))
-        return vType
-
-    def _build_Vehicle_node(self,
-                            id,
-                            depart,
-                            type,
-                            route):
-        args = locals()
-        vehicle = etree.Element('vehicle')
-        for attrb in args:
-            if attrb != 'self':
-                vehicle.set(attrb, str(args[attrb]))
-        return vehicle
-
     def step(self, action: float):
 
+        tc = self._tc
         action = float(action)
         assert type(float(action)) == float, "Expected action to be: float, Got: %s"%(type(action))
         
-        self._current_t_steps += 1
-        assert self._current_t_steps <= self._max_time_steps
-        
-        done = False
         if action < self.action_space.low[0] or action > self.action_space.high[0]:
             raise ValueError("Invalid action: {}, Expected [{}, {}].".format( 
                              action,
                              self.action_space.low[0],
                              self.action_space.high[0]))
 
-        # Get current speed of Ego Vehicle
-        current_speed = tc.vehicle.getSpeed("ego")
+        self._profiler.begin()
+        with self._profiler.phase("step"):
+            obs, reward, done, truncated, info = self._step(tc, action)
+        if self._recorder is not None:
+            with self._profiler.phase("step.record"):
+                self._record(obs, action, reward, done, truncated)
+        if self._profiler.enabled:
+            info["profile"] = self._profiler.last()
+        return obs, reward, done, truncated, info
 
-        # Get the new speed of the Ego Vehicle
-        new_speed = current_speed + action * self._t_step
-        new_speed = np.clip(new_speed, a_min=0.0, a_max=self._vehicle_config['maxSpeed'])
+    def _step(self, tc, action: float):
+        # The action is repeated for action_repeat simulation steps, the
+        # observation is only built after the last one.
+        reward = 0
+        for _ in range(self._action_repeat):
+            step_reward, done, truncated = self._advance(tc, action)
+            reward += step_reward
+            if done or truncated:
+                break
 
-        # Set the new speed of Ego Vehicle
-        tc.vehicle.setSpeed('ego', new_speed)
+        if not done:
+            with self._profiler.phase("step.get_obs"):
+                obs, nearby_vehicles = self._get_obs(tc)
+            info = {"num_vehicles_nearby": nearby_vehicles}
+            
+            # observation, reward, terminated, truncated, info     
+            return obs, reward, done, truncated, info     
+        else:
+            # Terminal State
+            if self._obs_mode == "image":
+                terminal_state = np.zeros(self.observation_space.shape, dtype=np.uint8)
+            else:
+                terminal_state = np.array([-1, -1, -1] * self._max_nearby_vehicles
+                                          + [-1] * len(self._tls_obs_fields) * self._num_traffic_lights).flatten()
+            return terminal_state, reward, done, truncated, {"collided": self._ego_collided}
+
+    def _advance(self, tc, action: float):
+        """Applies the action for a single simulation step.
+        Returns the reward of the step, terminated and truncated.
+        """
+        self._current_t_steps += 1
+        assert self._current_t_steps <= self._max_time_steps
+
+        done = False
+        profiler = self._profiler
+
+        with profiler.phase("step.set_speed"):
+            # Get current speed of Ego Vehicle
+            current_speed = tc.vehicle.getSubscriptionResults("ego")[tcc.VAR_SPEED]
+
+            # Get the new speed of the Ego Vehicle
+            new_speed = current_speed + action * self._t_step
+            new_speed = np.clip(new_speed, a_min=0.0, a_max=self._vehicle_config['maxSpeed'])
+
+            # Set the new speed of Ego Vehicle
+            tc.vehicle.setSpeed('ego', new_speed)
 
         # Perform a step in simulation
-        tc.simulationStep()
+        with profiler.phase("step.simulation_step"):
+            tc.simulationStep()
+            if self._obs_backend == "grid":
+                self._subscribe_departed_vehicles(tc)
 
         # Check collided vehicles
-        collided_vehicles = tc.simulation.getCollidingVehiclesIDList()
+        with profiler.phase("step.collision_check"):
+            sim_state = tc.simulation.getSubscriptionResults()
+            collided_vehicles = sim_state[tcc.VAR_COLLIDING_VEHICLES_IDS]
         if "ego" in collided_vehicles:
-            done = True
             self._logger.warn("Ego vehicle has collided")
-            reward = -30
-            terminal_state = np.array([-1, -1, -1] * self._max_nearby_vehicles).flatten()
-            return terminal_state, reward, done, False, {}
+            self._ego_collided = True
+            return -30, True, False
         else:
             if len(collided_vehicles) > 0:
                 self._logger.warn("Vehicles other ego has collided.")
         
         # Detect End of episode
-        veh_ids = list(tc.vehicle.getIDList())
-        if "ego" not in veh_ids:
-            done = True
-        
-        if tc.simulation.getMinExpectedNumber() <= 0:
-            done = True
+        with profiler.phase("step.termination_check"):
+            if "ego" in sim_state[tcc.VAR_ARRIVED_VEHICLES_IDS]:
+                done = True
+            
+            if sim_state[tcc.VAR_MIN_EXPECTED_VEHICLES] <= 0:
+                done = True
         
         truncated = True if self._current_t_steps >= self._max_time_steps else False
-        if not done:
-            # Reward function
-            # Reward for moving forward
-            # Penalize for large acc and deceleration
-            reward = tc.vehicle.getSpeed("ego")/tc.vehicle.getMaxSpeed("ego")
-            obs, nearby_vehicles = self._get_obs(tc)
-            info = {"num_vehicles_nearby": nearby_vehicles}
-            
-            # observation, reward, terminated, truncated, info     
-            return obs, reward, done, truncated, info     
-        else:
-            # Terminal State
-            reward = 0
-            terminal_state = np.array([-1, -1, -1] * self._max_nearby_vehicles).flatten()
-            return terminal_state, reward, done, truncated, {}
+        if done:
+            return 0, done, truncated
 
+        # Reward function
+        # Reward for moving forward
+        # Penalize for large acc and deceleration
+        with profiler.phase("step.reward"):
+            ego_state = tc.vehicle.getSubscriptionResults("ego")
+            reward = ego_state[tcc.VAR_SPEED]/ego_state[tcc.VAR_MAXSPEED]
+        return reward, done, truncated
 
     def _get_binary_abs_path(self, 
                              basePath: str, 
@@ -216,144 +492,390 @@ class V2I(gym.Env):
             raise RuntimeWarning("SUMO bins not found at: {}".format(str(basePath)))
     
     def _get_obs(self, tc):
-        nearby_vehs = self._get_ego_nearby_vehicles(tc, self._view_size)
-        ego_veh = nearby_vehs['ego']
-        dist_dict = {}
-        for veh in nearby_vehs.values():
-            dist = distance.euclidean((ego_veh.x, ego_veh.y), (veh.x, veh.y))
-            dist_dict[veh.id] = dist
-        dist_dict = sorted(dist_dict.items(), key=lambda x:x[1])
-        
-        obs = []
+        if self._obs_mode == "image":
+            return self._get_image_obs(tc)
+        ego_pos, num_vehicles = self._get_ego_nearby_vehicles(tc, self._view_size)
+        self._obs_ref = (ego_pos, num_vehicles)
+        obs, num_nearby_vehs = self._obs_builder.build(ego_pos, num_vehicles)
+        if self._num_traffic_lights:
+            return np.concatenate([obs.ravel(), self._get_traffic_light_obs(tc)]), num_nearby_vehs
+        # Builder output is reused on the next call, hand out a copy.
+        return obs.flatten(), num_nearby_vehs
 
-        for idx, (vid, dist) in enumerate(dist_dict):
-            v = nearby_vehs[vid]
-            obs.append( (v.x, v.y, v.speed))
-            if (idx + 1) >= self._max_nearby_vehicles:
-                break
-        remaining_obs = self._max_nearby_vehicles - len(obs)
-        if remaining_obs > 0:
-            obs = obs + [(-1, -1, -1)] * remaining_obs
-        obs = np.array(obs, dtype=np.float32).flatten()
-        return obs, len(nearby_vehs)
+    def _get_image_obs(self, tc):
+        """Returns the bird's-eye frame and the number of vehicles within
+        view of ego, both from the ego context subscription. Vehicles in
+        view are kept for recording, see _get_neighbors."""
+        results = tc.vehicle.getContextSubscriptionResults("ego")
+        assert 'ego' in results
+        positions, speeds, angles = self._get_context_states(results)
+        ego_idx = list(results).index("ego")
+        frame = self._draw_frame(positions, angles, ego_idx).copy()
+        ego_pos = positions[ego_idx]
+        rel = positions - ego_pos
+        in_view = np.flatnonzero(np.sqrt(np.einsum("ij,ij->i", rel, rel)) <= self._view_size)
+        self._obs_ref = (ego_pos, np.column_stack([positions[in_view], speeds[in_view]]))
+        return frame, len(in_view)
+
+    def _get_traffic_light_obs(self, tc):
+        """Observation of the traffic lights ahead of ego, nearest first,
+        from subscription results. Missing lights are filled with -1."""
+        out = np.full((self._num_traffic_lights, len(self._tls_obs_fields)), -1, dtype=np.float32)
+        now = tc.simulation.getSubscriptionResults()[tcc.VAR_TIME]
+        upcoming = tc.vehicle.getSubscriptionResults("ego")[tcc.VAR_NEXT_TLS]
+        for row, (tls_id, _, distance, state) in zip(out, upcoming):
+            tls = tc.trafficlight.getSubscriptionResults(tls_id)
+            row[:] = (self._tls_state_codes.get(state, 0.0),
+                      tls[tcc.TL_NEXT_SWITCH] - now,
+                      distance)
+        return out.ravel()
 
     def _get_ego_nearby_vehicles(self, tc, viewSize: int):
-        veh_ids = list(tc.vehicle.getIDList())
+        """Fills the observation builder buffers with the vehicles near ego.
+
+        Returns the ego position and the number of buffered vehicles. Only
+        vehicles within viewSize are guaranteed to have a valid speed.
+        """
+        if self._obs_backend == "subscription":
+            return self._get_ego_nearby_vehicles_subscribed(tc, viewSize)
+        elif self._obs_backend == "grid" and self._v2x is not None:
+            return self._get_ego_nearby_vehicles_v2x(tc, viewSize)
+        elif self._obs_backend == "grid":
+            return self._get_ego_nearby_vehicles_indexed(tc, viewSize)
+
+        veh_ids = tc.vehicle.getIDList()
         assert 'ego' in veh_ids
-        #veh_ids.remove('ego')
-        veh_positions = {}
         ref_pos_ego = tc.vehicle.getPosition("ego")
-        for veh_id in veh_ids:
-            pos = tc.vehicle.getPosition(veh_id)
-            dist = distance.euclidean(ref_pos_ego, pos)
-            if dist <= viewSize:
-                trans_pos = pos[0] - ref_pos_ego[0], pos[1] - ref_pos_ego[1]
-                
-                v = Vehicle(id=veh_id,
-                            x=trans_pos[0],
-                            y=trans_pos[1],
-                            speed=tc.vehicle.getSpeed(veh_id))
+        positions, speeds = self._obs_builder.buffers(len(veh_ids))
+        for idx, veh_id in enumerate(veh_ids):
+            positions[idx] = tc.vehicle.getPosition(veh_id)
+        for idx in self._obs_builder.in_range(ref_pos_ego, len(veh_ids)):
+            speeds[idx] = tc.vehicle.getSpeed(veh_ids[idx])
+        return ref_pos_ego, len(veh_ids)
 
-                veh_positions[veh_id] = v
+    def _subscribe_ego_context(self, tc):
+        """Subscribes to position and speed of all vehicles within view
+        of the ego vehicle. Results are delivered with every simulationStep.
+        More info: https://sumo.dlr.de/docs/TraCI/Interfacing_TraCI_from_Python.html#context_subscriptions
+        """
+        radius = self._view_size
+        variables = [tcc.VAR_POSITION, tcc.VAR_SPEED]
+        if self._renders:
+            # SUMO keeps one context subscription per vehicle, the renderer
+            # shares it and needs headings of all vehicles in the frame.
+            radius = max(radius, self._get_renderer().radius)
+            variables.append(tcc.VAR_ANGLE)
+        tc.vehicle.subscribeContext("ego",
+                                    tcc.CMD_GET_VEHICLE_VARIABLE,
+                                    radius,
+                                    variables)
 
-        return veh_positions
+    def _get_ego_nearby_vehicles_subscribed(self, tc, viewSize: int):
+        results = tc.vehicle.getContextSubscriptionResults("ego")
+        assert 'ego' in results
+        ref_pos_ego = results["ego"][tcc.VAR_POSITION]
+        # SUMO returns context results sorted by vehicle id, same as getIDList.
+        # The builder repeats the range check, so that both backends agree
+        # exactly on vehicles lying on the boundary of the view.
+        positions, speeds = self._obs_builder.buffers(len(results))
+        for idx, values in enumerate(results.values()):
+            positions[idx] = values[tcc.VAR_POSITION]
+            speeds[idx] = values[tcc.VAR_SPEED]
+        return ref_pos_ego, len(results)
+
+    def _subscribe_episode_state(self, tc):
+        """Subscribes to the simulation and ego variables read by step for
+        reward and termination, so they arrive with every simulationStep.
+        """
+        sim_vars = [tcc.VAR_COLLIDING_VEHICLES_IDS,
+                    tcc.VAR_ARRIVED_VEHICLES_IDS,
+                    tcc.VAR_MIN_EXPECTED_VEHICLES]
+        ego_vars = [tcc.VAR_SPEED, tcc.VAR_MAXSPEED]
+        if self._obs_backend == "grid":
+            # Subscribing again to the same object replaces its variables,
+            # so the ones of the grid backend are included here.
+            sim_vars.append(tcc.VAR_DEPARTED_VEHICLES_IDS)
+            ego_vars.append(tcc.VAR_POSITION)
+        if self._num_traffic_lights:
+            sim_vars.append(tcc.VAR_TIME)
+            ego_vars.append(tcc.VAR_NEXT_TLS)
+            self._subscribe_traffic_lights(tc)
+        tc.simulation.subscribe(sim_vars)
+        tc.vehicle.subscribe("ego", ego_vars)
+
+    def _subscribe_traffic_lights(self, tc):
+        """Subscribes to the next switch time of every traffic light of
+        the net. The phase is observed through the signal state of ego's
+        lane, program indices are specific to the net."""
+        for tls_id in self._get_tls_ids(tc):
+            tc.trafficlight.subscribe(tls_id, [tcc.TL_NEXT_SWITCH])
+
+    def _get_tls_ids(self, tc):
+        if self._tls_ids is None:
+            self._tls_ids = tc.trafficlight.getIDList()
+        return self._tls_ids
+
+    def _subscribe_all_vehicles(self, tc):
+        """Subscribes to position and speed of every vehicle in the
+        simulation, vehicles departing later are subscribed by
+        _subscribe_departed_vehicles.
+        """
+        self._reset_vehicle_ids = tc.vehicle.getIDList()
+        for veh_id in self._reset_vehicle_ids:
+            tc.vehicle.subscribe(veh_id, [tcc.VAR_POSITION, tcc.VAR_SPEED])
+
+    def _subscribe_departed_vehicles(self, tc):
+        """Subscribes to position and speed of vehicles which departed in
+        the last simulation step, called after every step, also the ones
+        of repeated actions. Subscriptions end when vehicles arrive.
+        """
+        departed = tc.simulation.getSubscriptionResults()[tcc.VAR_DEPARTED_VEHICLES_IDS]
+        for veh_id in departed:
+            tc.vehicle.subscribe(veh_id, [tcc.VAR_POSITION, tcc.VAR_SPEED])
+
+    def _update_vehicle_index(self, tc):
+        """Rebuilds the spatial index from the subscribed vehicle states."""
+        results = tc.vehicle.getAllSubscriptionResults()
+        if self._reset_vehicle_ids is not None:
+            # Until the first simulation step after a reset, results of
+            # vehicles from the previous episode are still cached.
+            results = {veh_id: results[veh_id] for veh_id in self._reset_vehicle_ids}
+            self._reset_vehicle_ids = None
+        self._vehicle_ids = list(results)
+        positions = np.array([values[tcc.VAR_POSITION] for values in results.values()],
+                             dtype=np.float64).reshape(-1, 2)
+        self._vehicle_speeds = np.array([values[tcc.VAR_SPEED] for values in results.values()],
+                                        dtype=np.float64)
+        self._vehicle_index.build(positions)
+
+    def query_nearby_vehicles(self, veh_id: str, radius: float=None, k: int=None):
+        """Returns ids of vehicles near veh_id, including itself, using the
+        spatial index of the grid backend.
+
+        With k, the k nearest vehicles within radius (unbounded if None)
+        are returned nearest first. Otherwise all vehicles within radius
+        (view size if None) are returned.
+        """
+        if self._obs_backend != "grid":
+            raise RuntimeError("Nearby vehicle queries require obs_backend=\"grid\".")
+        point = self._vehicle_index.positions[self._vehicle_ids.index(veh_id)]
+        if k is not None:
+            max_radius = float("inf") if radius is None else radius
+            indices = self._vehicle_index.query_knn(point, k, max_radius=max_radius)
+        else:
+            radius = self._view_size if radius is None else radius
+            indices = self._vehicle_index.query_radius(point, radius)
+        return [self._vehicle_ids[idx] for idx in indices]
+
+    def _get_ego_nearby_vehicles_indexed(self, tc, viewSize: int):
+        self._update_vehicle_index(tc)
+        assert 'ego' in self._vehicle_ids
+        ref_pos_ego = self._vehicle_index.positions[self._vehicle_ids.index("ego")]
+        nearby = self._vehicle_index.query_radius(ref_pos_ego, viewSize)
+        positions, speeds = self._obs_builder.buffers(len(nearby))
+        positions[:] = self._vehicle_index.positions[nearby]
+        speeds[:] = self._vehicle_speeds[nearby]
+        return ref_pos_ego, len(nearby)
+
+    def _reset_v2x(self, tc):
+        rsu_positions = [tc.junction.getPosition(junction) for junction in self._v2x.rsu_junctions]
+        self._v2x.reset(rsu_positions, num_receivers=1, t_step=self._t_step, np_random=self.np_random)
+
+    def _get_ego_nearby_vehicles_v2x(self, tc, viewSize: int):
+        """Fills the observation builder buffers with ego and the states
+        ego last heard from other vehicles."""
+        self._update_vehicle_index(tc)
+        assert 'ego' in self._vehicle_ids
+        with self._profiler.phase("step.get_obs.v2x" if self._current_t_steps else "reset.get_obs.v2x"):
+            self._v2x.step(self._current_t_steps, self._vehicle_ids, self._vehicle_index.positions,
+                           self._vehicle_speeds, ["ego"])
+            _, heard_positions, heard_speeds = self._v2x.received(0, self._current_t_steps)
+        ego_idx = self._vehicle_ids.index("ego")
+        positions, speeds = self._obs_builder.buffers(len(heard_speeds) + 1)
+        positions[0] = self._vehicle_index.positions[ego_idx]
+        speeds[0] = self._vehicle_speeds[ego_idx]
+        positions[1:] = heard_positions
+        speeds[1:] = heard_speeds
+        return self._vehicle_index.positions[ego_idx], len(speeds)
+
+    def profile_summary(self, clear: bool=False):
+        """Returns time per phase of step and reset, and counters such as
+        the number of calls made to SUMO, accumulated since construction
+        or the last clear. Empty unless the env was created with profile=True.
+        """
+        summary = self._profiler.summary()
+        if clear:
+            self._profiler.clear()
+        return summary
 
-    
     def __del__(self):
         """Clean up simulation before destroying the object.
         """
-        if tc.isLoaded():
-            tc.close()
+        if getattr(self, "_tc", None) is not None:
+            self._close_connection()
+        if getattr(self, "_workspace", None) is not None:
+            self._remove_workspace()
+        if getattr(self, "_recorder", None) is not None:
+            self._recorder.close()
         sys.stdout.flush()
     
     def render(self):
-        """render is called during training. 
-        Keep render empty for now.
+        """With render_mode="rgb_array", returns the bird's-eye view around
+        ego as an (image_size, image_size, 3) uint8 array: lanes in gray,
+        ego in red and other vehicles in yellow, north up. With "human",
+        sumo-gui shows the simulation and nothing is returned.
         """
-        pass
+        if self.render_mode != "rgb_array":
+            return None
+        if self._tc is None:
+            return np.zeros(self._get_renderer().shape, dtype=np.uint8)
+        with self._profiler.phase("render"):
+            return self._render_frame(self._tc).copy()
+
+    def _get_renderer(self):
+        if self._renderer is None:
+            # The margin keeps frames of vehicles at the border of the net
+            # inside the raster.
+            margin = self._image_size * self._meters_per_pixel
+            background, origin = _net_background(self._meters_per_pixel, margin)
+            self._renderer = BirdsEyeRasterizer(background, origin, self._meters_per_pixel,
+                                                size=self._image_size,
+                                                vehicle_length=self._vehicle_config['length'])
+        return self._renderer
+
+    def _render_frame(self, tc):
+        """Draws the vehicles of the ego context subscription into the
+        renderer's frame buffer and returns it."""
+        results = tc.vehicle.getContextSubscriptionResults("ego")
+        if not results or "ego" not in results:
+            # Ego left the simulation, the last frame is kept
+            return self._get_renderer().frame
+        positions, _, angles = self._get_context_states(results)
+        return self._draw_frame(positions, angles, list(results).index("ego"))
+
+    @staticmethod
+    def _get_context_states(results):
+        """Returns the (N, 2) positions, (N,) speeds and (N,) headings of
+        ego context subscription results."""
+        positions = np.array([values[tcc.VAR_POSITION] for values in results.values()],
+                             dtype=np.float64).reshape(-1, 2)
+        speeds = np.array([values[tcc.VAR_SPEED] for values in results.values()], dtype=np.float64)
+        angles = np.array([values[tcc.VAR_ANGLE] for values in results.values()], dtype=np.float64)
+        return positions, speeds, angles
+
+    def _draw_frame(self, positions, angles, ego_idx: int):
+        renderer = self._get_renderer()
+        # Centred on the middle of ego, positions are front bumpers
+        heading = np.radians(angles[ego_idx])
+        center = positions[ego_idx] - np.array([np.sin(heading), np.cos(heading)]) * (self._vehicle_config['length'] / 2)
+        return renderer.render(center, positions, angles, ego_index=ego_idx)
     
     def close(self):
-        """Closes the TraCI connection, if opened.
+        """Closes the TraCI connection, if opened, and removes the scenario
+        workspace.
         """
-        if tc.isLoaded():
-            tc.close()
+        if self._tc is not None:
+            self._close_connection()
         self._logger.debug("Stopped SUMO TraCI server.")
+        if self._workspace is not None:
+            self._remove_workspace()
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
+        if self._checkpoints is not None:
+            # States refer to the scenario files of the workspace
+            self._checkpoints.clear()
 
-    def reset(self, seed=None, options=None):
-        # We need the following line to seed self.np_random
-        super().reset(seed=seed)
+    def _close_connection(self):
+        if isinstance(self._traci_log, TraciRecorder):
+            self._traci_log.stop()
+        elif isinstance(self._traci_log, TraciReplay):
+            self._replay_start = self._traci_log.next_episode
+        self._traci_log = None
+        if self._pool_conn is not None and self._state_loaded:
+            # Other envs of the pool would inherit the loaded state
+            self._server_pool.discard(self._pool_conn)
+            self._pool_conn = None
+        elif self._pool_conn is not None:
+            self._server_pool.release(self._pool_conn)
+            self._pool_conn = None
+        else:
+            self._tc.close()
+        self._tc = None
+        self._state_loaded = False
+        global _libsumo_owner
+        if _libsumo_owner is not None and _libsumo_owner() in (self, None):
+            _libsumo_owner = None
 
-        # Loads XMLs
-        basePath = pathlib.Path(__file__).parent.parent
-        xmlPath = os.path.abspath(os.path.join(basePath, "xmls"))
-        
-        # Route file
-        routeRoot = etree.fromstring(base64.b64decode(ROUTE_XML))
-        
-        num_vehicles = 50
-        ego_veh_id = num_vehicles//2
-        
-        # Define vehicle Types        
-        # Ego vehicle
-        vType = self._build_VType_node(id="ego_vType",
-                                       length=self._vehicle_config['length'],
-                                       maxSpeed=self._vehicle_config['maxSpeed'],
-                                       maxAccel=self._vehicle_config['maxAccel'],
-                                       maxDecel=self._vehicle_config['maxDecel'],
-                                       minGap=self._vehicle_config['minGap'],
-                                       color="red")
-                                           
-        routeRoot.append(vType)
-        
-        # Non-Ego vehicle
-        vType = self._build_VType_node(id="non_ego_vType",
-                                       length=self._vehicle_config['length'],
-                                       maxSpeed=self._vehicle_config['maxSpeed'],
-                                       maxAccel=self._vehicle_config['maxAccel'],
-                                       maxDecel=self._vehicle_config['maxDecel'],
-                                       minGap=self._vehicle_config['minGap'],
-                                       color="yellow")
-                                           
-        routeRoot.append(vType)
-
-        # Populate vehicles in the scene
-        switch = True
-        for veh in range(num_vehicles):
-
-            if veh == ego_veh_id:
-                route = self.np_random.choice(["r_0", "r_1"])
-                v = self._build_Vehicle_node(id="ego",
-                                             type="ego_vType",
-                                             depart="0.0",
-                                             route=route)
-            else:
-                route = "r_0" if switch else "r_1"
-                v = self._build_Vehicle_node(id="car_" + str(veh),
-                                             type="non_ego_vType",
-                                             depart="0.0",
-                                             route=route)
-                switch = not switch
+    @property
+    def workspace(self):
+        """Directory holding the scenario files of this instance, None
+        before the first reset and after close."""
+        return self._workspace
 
-            routeRoot.append(v)                                 
+    def _get_scenario_cache(self):
+        if self._scenario_cache is None:
+            os.makedirs(self._workspace_root, exist_ok=True)
+            prefix = "v2i-{}-".format(self._label.replace(os.sep, "_"))
+            self._workspace = tempfile.mkdtemp(prefix=prefix, dir=self._workspace_root)
+            self._scenario_cache = ScenarioCache(os.path.join(self._workspace, "scenarios"),
+                                                 max_scenarios=self._max_scenarios)
+            self._logger.debug("Created scenario workspace: {}".format(self._workspace))
+        return self._scenario_cache
 
-        etree.indent(routeRoot)
-        
-        with open(os.path.abspath(os.path.join(xmlPath, "v2v.rou.xml")), "wb") as f:
-            data = etree.tostring(routeRoot, encoding="utf-8", xml_declaration=True, pretty_print=True)
-            f.write(data)
-        
-        # Load Net XML
-        netRoot = etree.fromstring(base64.b64decode(NET_XML))
+    def _remove_workspace(self):
+        shutil.rmtree(self._workspace, ignore_errors=True)
+        self._logger.debug("Removed scenario workspace: {}".format(self._workspace))
+        self._workspace = None
+        self._scenario_cache = None
+
+    def _get_vtypes(self):
+        """Attributes of the vTypes in the route file, ego first."""
+        vTypes = []
+        for vType, color in (("ego_vType", "red"), ("non_ego_vType", "yellow")):
+            vTypes.append({"id": vType,
+                           "length": self._vehicle_config['length'],
+                           "maxSpeed": self._vehicle_config['maxSpeed'],
+                           "maxAccel": self._vehicle_config['maxAccel'],
+                           "maxDecel": self._vehicle_config['maxDecel'],
+                           "minGap": self._vehicle_config['minGap'],
+                           "color": color})
+        if self._traffic.vtypes is not None:
+            vTypes = vTypes[:1] + self._traffic.vtypes
+        return vTypes
+
+    def _get_scenario_params(self, vehicles):
+        """Everything the generated scenario files depend on."""
+        return {"source": _scenario_source(),
+                "vehicle_config": self._vehicle_config,
+                "vtypes": self._get_vtypes(),
+                "vehicles": vehicles}
 
-        # Write modified Net XML
-        with open(os.path.abspath(os.path.join(basePath, "xmls/v2v.net.xml")), "wb") as f:
-            data = etree.tostring(netRoot, encoding="utf-8", xml_declaration=True, pretty_print=True)
-            f.write(data)
+    def _write_scenario(self, scenarioPath: str, vehicles):
+        """Writes the net, route and sumo config files of a scenario."""
+        with self._profiler.phase("reset.scenario.xml_build"):
+            files = self._build_scenario_files()
+        with self._profiler.phase("reset.scenario.file_write"):
+            for name, data in files.items():
+                with open(os.path.join(scenarioPath, name), "wb") as f:
+                    f.write(data)
+            # Routes are streamed, large fleets never live in an XML tree
+            TrafficGenerator.write_routes(os.path.join(scenarioPath, "v2v.rou.xml"),
+                                          _route_defs(),
+                                          self._get_vtypes(),
+                                          vehicles)
+
+    def _build_scenario_files(self):
+        """Returns the contents of the net and sumo config files, keyed by
+        file name."""
+        xmlPath = os.path.abspath(os.path.join(pathlib.Path(__file__).parent.parent, "xmls"))
+        files = {}
+
+        # Net XML is the same for every scenario
+        files["v2v.net.xml"] = _net_file()
 
         # Edit sumo config
-        sumoConfigPath = os.path.abspath(os.path.join(basePath, "xmls/v2v.sumocfg"))
-        
-        with open(sumoConfigPath, "rb") as f:
+        with open(os.path.join(xmlPath, "v2v.sumocfg"), "rb") as f:
             sumocfgRoot = etree.fromstring(f.read())
         
         for item in sumocfgRoot:
@@ -363,33 +885,57 @@ class V2I(gym.Env):
                 elif tags.tag == "route-files":
                     tags.set("value", "v2v.rou.xml")
         
-        with open(sumoConfigPath, "wb") as f:
-            data = etree.tostring(sumocfgRoot, encoding="utf-8", xml_declaration=True, pretty_print=True)
-            f.write(data)
-        
+        files["v2v.sumocfg"] = etree.tostring(sumocfgRoot, encoding="utf-8", xml_declaration=True, pretty_print=True)
+        return files
 
-        # Reload with modified config
-        binsPath = os.path.abspath(os.path.join(basePath, "bins"))
-        mode = "gui" if self.render_mode == "human" else None
-        args = self._build_sim_args(sumoConfig=str(basePath) + "/xmls/v2v.sumocfg",
-                                    t_step=self._t_step)
-        binary = None
-        if mode == "gui":
-            binary = "sumo-gui"
-            self._logger.debug("Starting in GUI-mode.")
-        else:
-            binary = "sumo"
-            self._logger.debug("Starting in non GUI-mode(simulation mode).")
-        
-        if not tc.isLoaded():
-            #args = [self._get_binary_abs_path(binsPath, mode=mode)] + args
-            #print(args)
-            tc.start([binary] + args)
-            self._logger.debug("Started SUMO TraCI server.")
+    def _get_recorder(self):
+        if self._recorder is None:
+            columns = trajectory_columns(self.observation_space.shape, self.observation_space.dtype)
+            self._recorder = TrajectoryWriter(os.path.join(self._record_dir, self._label), columns)
+        return self._recorder
+
+    def _get_neighbors(self):
+        """Returns the ego position and the absolute (x, y, speed) of the
+        vehicles in view, as seen by the last observation."""
+        if self._obs_mode == "image":
+            return self._obs_ref
+        ego_pos, num_vehicles = self._obs_ref
+        positions, speeds = self._obs_builder.buffers(num_vehicles)
+        in_view = self._obs_builder.in_range(ego_pos, num_vehicles)
+        return ego_pos, np.column_stack([positions[in_view], speeds[in_view]])
+
+    def _record(self, obs, action=np.nan, reward=0.0, terminated=False, truncated=False):
+        if terminated or truncated:
+            # No observation is built for the terminal state
+            ego_pos, neighbors = (np.nan, np.nan), None
         else:
-            tc.load(args)
-            self._logger.debug("Reloaded SUMO TraCI server.")
-        
+            ego_pos, neighbors = self._get_neighbors()
+        self._recorder.append(obs=obs,
+                              action=action,
+                              reward=reward,
+                              terminated=terminated,
+                              truncated=truncated,
+                              ego_pos=ego_pos,
+                              num_neighbors=0 if neighbors is None else len(neighbors),
+                              neighbors=neighbors)
+        if terminated or truncated:
+            self._recorder.end_episode()
+
+    def _wrap_connection(self, tc):
+        """Logs calls to SUMO when a replay_dir is set and counts them when
+        profiling."""
+        if self._replay_dir is not None and self._sumo_backend != "replay":
+            os.makedirs(self._replay_dir, exist_ok=True)
+            tc = self._traci_log = TraciRecorder(tc, self._get_replay_path())
+        if self._profiler.enabled:
+            return CountingConnection(tc, self._profiler, "sumo_calls")
+        return tc
+
+    def _get_replay_path(self):
+        return os.path.join(self._replay_dir, "{}.traci".format(self._label))
+
+    def _warm_up(self, tc):
+        """Simulates until the ego vehicle departs."""
         # Simulate until Ego Vehicle appers
         done = False
         veh_ids = None
@@ -400,16 +946,324 @@ class V2I(gym.Env):
             num_steps += 1
             if "ego" in veh_ids:
                 break
-        
+        self._profiler.count("warm_up_steps", num_steps)
+
+    def _save_snapshot(self, tc, statePath: str):
+        """Saves the simulation state next to the scenario files. The
+        state is written under a temporary name first, since the scenario
+        directory may be shared with other processes.
+        """
+        tmpPath = "{}.{}.{}.tmp".format(statePath, os.getpid(), self._label)
+        tc.simulation.saveState(tmpPath)
+        os.replace(tmpPath, statePath)
+        self._logger.debug("Saved snapshot: {}".format(statePath))
+
+    def reset(self, seed=None, options=None):
+        # We need the following line to seed self.np_random
+        super().reset(seed=seed)
+
+        self._profiler.begin()
+        with self._profiler.phase("reset"):
+            obs, info = self._reset()
+        if self._record_dir is not None:
+            with self._profiler.phase("reset.record"):
+                self._get_recorder().begin_episode(seed)
+                self._record(obs)
+        if self._profiler.enabled:
+            info["profile"] = self._profiler.last()
+        return obs, info
+
+    def _reset(self):
+        tc = self._start_episode()
+        self._take_control(tc)
+        if self._v2x is not None:
+            self._reset_v2x(tc)
+
+        # Reset step counter
+        self._current_t_steps = 0
+        self._ego_collided = False
+
+        # Returns the list of vehicles and count
+        with self._profiler.phase("reset.get_obs"):
+            obs, num_nearby_veh = self._get_obs(tc)
+        return obs, {"num_vehicles_nearby": num_nearby_veh}
+
+    def _take_control(self, tc):
+        """Hands ego over to the agent and subscribes to the variables
+        read by step and the obs backend."""
         # Disable all checks for ego vehicle
         # Allows to control ego vehicle externally
         # More info: https://sumo.dlr.de/docs/TraCI/Change_Vehicle_State.html#speed_mode_0xb3
         tc.vehicle.setSpeedMode("ego", 32)
 
-        # Reset step counter
-        self._current_t_steps = 0
+        if self._obs_backend == "subscription" or self._renders:
+            self._subscribe_ego_context(tc)
+        if self._obs_backend == "grid":
+            self._subscribe_all_vehicles(tc)
+        self._subscribe_episode_state(tc)
 
-        # Returns the list of vehicles and count
-        obs, num_nearby_veh = self._get_obs(tc)
+    def fork(self, key: Optional[Hashable]=None):
+        """Checkpoints the running episode into the checkpoint cache: the
+        SUMO state with its random number generators, the step counter,
+        np_random and the V2X channel. Returns the key of the checkpoint,
+        key if given, a new integer otherwise. See restore.
+
+        Forking after the episode terminated is not supported.
+        """
+        if self._checkpoints is None:
+            raise RuntimeError("Forking requires a checkpoint cache, see the checkpoints argument.")
+        if self._tc is None:
+            raise RuntimeError("Forking requires a running episode, call reset first.")
+        key = self._checkpoints.new_key() if key is None else key
+        tc = self._tc
+        with self._profiler.phase("fork"):
+            statePath = self._checkpoints.new_path()
+            tc.simulation.saveState(statePath)
+            # States saved after a restore repeat the phase timing loaded
+            # by it, the time left in the current phase is kept aside.
+            now = tc.simulation.getTime()
+            tls = [(tls_id, tc.trafficlight.getNextSwitch(tls_id) - now) for tls_id in self._get_tls_ids(tc)]
+            state = {"scenario_params": self._scenario_params,
+                     "tls": tls,
+                     "soft_future": self._soft_future,
+                     "t_steps": self._current_t_steps,
+                     "ego_collided": self._ego_collided,
+                     "np_random": self.np_random.bit_generator.state,
+                     "v2x": None if self._v2x is None else self._v2x.get_state()}
+            self._checkpoints.put(key, statePath, state)
+        return key
+
+    def restore(self, key: Hashable):
+        """Rolls the episode back to the checkpoint of key and returns the
+        observation and info at it, as reset does. Checkpoints stay cached,
+        any number of branches can be run from one. Raises KeyError if the
+        checkpoint was evicted.
+
+        Branches continue exactly like the episode did after fork, given
+        the same actions.
+        """
+        if self._checkpoints is None:
+            raise RuntimeError("Restoring requires a checkpoint cache, see the checkpoints argument.")
+        if self._tc is None:
+            raise RuntimeError("Restoring requires a running SUMO, call reset first.")
+        self._profiler.begin()
+        with self._profiler.phase("restore"):
+            obs, info = self._restore(self._tc, key)
+        if self._profiler.enabled:
+            info["profile"] = self._profiler.last()
+        return obs, info
+
+    def _restore(self, tc, key: Hashable):
+        statePath, state = self._checkpoints.get(key)
+        # The net is read from the scenario files, written again if the
+        # scenario was evicted from the cache since the fork.
+        params = state["scenario_params"]
+        scenarioPath = self._get_scenario_cache().get(params,
+                                                      lambda path: self._write_scenario(path, params["vehicles"]))
+        # Loaded through the command line, see _start_episode
+        with self._profiler.phase("restore.load"):
+            tc.load(self._build_sim_args(sumoConfig=os.path.join(scenarioPath, "v2v.sumocfg"),
+                                         t_step=self._t_step,
+                                         statePath=statePath))
+        self._state_loaded = self._sumo_backend == "traci"
+        self._scenario_params = params
+        self._soft_unlisted = ()
+        self._soft_future = state["soft_future"]
+        for tls_id, remaining in state["tls"]:
+            tc.trafficlight.setPhaseDuration(tls_id, remaining)
+        self._take_control(tc)
+        self._current_t_steps = state["t_steps"]
+        self._ego_collided = state["ego_collided"]
+        # Set in place, the V2X channel draws from the same generator
+        self.np_random.bit_generator.state = state["np_random"]
+        if self._v2x is not None:
+            self._v2x.set_state(state["v2x"])
+
+        with self._profiler.phase("restore.get_obs"):
+            obs, num_nearby_veh = self._get_obs(tc)
         return obs, {"num_vehicles_nearby": num_nearby_veh}
 
+    def _start_episode(self):
+        """Loads the scenario of a new episode into SUMO, starting SUMO if
+        needed, and brings it to the step in which the ego vehicle departs.
+        Returns the connection.
+        """
+        basePath = pathlib.Path(__file__).parent.parent
+
+        # Scenario files are only generated the first time a route
+        # assignment is seen, later resets reuse the cached files.
+        ego_route = str(self.np_random.choice(["r_0", "r_1"]))
+        vehicles = self._traffic.generate(self.np_random, ego_route)
+        params = self._get_scenario_params(vehicles)
+
+        # Replays skip loading and warm-up, the recording starts after them
+        if self._sumo_backend == "replay":
+            if self._tc is None:
+                self._traci_log = TraciReplay(self._get_replay_path(), start=self._replay_start)
+                self._tc = self._wrap_connection(self._traci_log)
+            self._traci_log.begin_episode(ScenarioCache.key(params))
+            return self._tc
+        if self._traci_log is not None:
+            self._traci_log.end_episode()
+
+        # All scenarios share the net, routes and vTypes, so a recorded
+        # fleet can be re-inserted into whichever scenario is loaded.
+        softKey = ScenarioCache.key(params) if self._reset_mode == "soft" else None
+
+        if self._tc is not None and softKey in self._soft_states:
+            self._soft_states.move_to_end(softKey)
+            with self._profiler.phase("reset.soft"):
+                self._soft_reset(self._tc, self._soft_states[softKey])
+            if self._traci_log is not None:
+                self._traci_log.begin_episode(ScenarioCache.key(params))
+            return self._tc
+
+        self._soft_unlisted = ()
+        self._soft_future = ()
+        with self._profiler.phase("reset.scenario"):
+            scenarioPath = self._get_scenario_cache().get(params,
+                                                          lambda path: self._write_scenario(path, vehicles))
+        sumoConfigPath = os.path.join(scenarioPath, "v2v.sumocfg")
+        self._scenario_params = params
+
+        # States are loaded through the command line instead of
+        # simulation.loadState, which does not restore the order in which
+        # lanes are processed and so diverges from a fresh load.
+        statePath = os.path.join(scenarioPath, "v2v.state.xml")
+        restore = self._reset_mode == "snapshot" and os.path.exists(statePath)
+
+        # Reload with modified config
+        binsPath = os.path.abspath(os.path.join(basePath, "bins"))
+        mode = "gui" if self.render_mode == "human" else None
+        args = self._build_sim_args(sumoConfig=sumoConfigPath,
+                                    t_step=self._t_step,
+                                    statePath=statePath if restore else None)
+        if self._tc is not None and self._state_loaded and not restore:
+            # After a state load, the TraCI server runs the next scenario it
+            # loads differently from a new server, ego departing a step late
+            # for example. SUMO is started again for fresh loads instead,
+            # libsumo starts anew on load.
+            with self._profiler.phase("reset.restart"):
+                self._close_connection()
+            self._logger.debug("Restarting SUMO after a state load.")
+
+        binary = None
+        if mode == "gui":
+            binary = "sumo-gui"
+            self._logger.debug("Starting in GUI-mode.")
+        else:
+            binary = "sumo"
+            self._logger.debug("Starting in non GUI-mode(simulation mode).")
+        
+        if self._tc is None and self._server_pool is not None:
+            with self._profiler.phase("reset.lease"):
+                self._pool_conn = self._server_pool.acquire()
+            self._tc = self._wrap_connection(self._pool_conn)
+            self._logger.debug("Leased SUMO server from pool.")
+
+        if self._tc is None and self._sumo_backend == "libsumo":
+            global _libsumo_owner
+            owner = _libsumo_owner() if _libsumo_owner is not None else None
+            if owner is not None and owner is not self:
+                raise RuntimeError("libsumo supports a single simulation per process and env {!r} already "
+                                   "runs one. Close it first or use the traci backend.".format(owner._label))
+            with self._profiler.phase("reset.start"):
+                import libsumo
+                libsumo.start([binary] + args)
+            _libsumo_owner = weakref.ref(self)
+            self._tc = self._wrap_connection(libsumo)
+            self._logger.debug("Started SUMO in-process with libsumo.")
+        elif self._tc is None:
+            #args = [self._get_binary_abs_path(binsPath, mode=mode)] + args
+            #print(args)
+            with self._profiler.phase("reset.start"):
+                traci.start([binary] + args, label=self._label)
+            self._tc = self._wrap_connection(traci.getConnection(self._label))
+            self._logger.debug("Started SUMO TraCI server.")
+        else:
+            with self._profiler.phase("reset.load"):
+                self._tc.load(args)
+            self._logger.debug("Reloaded SUMO TraCI server.")
+        tc = self._tc
+        self._state_loaded |= restore and self._sumo_backend == "traci"
+
+        if not restore:
+            with self._profiler.phase("reset.warm_up"):
+                self._warm_up(tc)
+            if self._reset_mode == "snapshot":
+                with self._profiler.phase("reset.snapshot_save"):
+                    self._save_snapshot(tc, statePath)
+        if softKey is not None:
+            self._soft_states[softKey] = self._get_fleet_state(tc, vehicles)
+            if len(self._soft_states) > self._max_scenarios:
+                self._soft_states.popitem(last=False)
+            now = tc.simulation.getTime()
+            self._soft_future = [(veh_id, now + offset) for veh_id, _, _, offset in
+                                 self._soft_states[softKey]["future"]]
+        if self._traci_log is not None:
+            self._traci_log.begin_episode(ScenarioCache.key(params))
+        return tc
+
+    def _get_fleet_state(self, tc, vehicles):
+        """Returns everything needed to re-insert the current vehicles:
+        (id, vType, route, lane, lane position, speed, speed factor) of
+        running vehicles, (id, vType, route, speed factor) of vehicles
+        waiting for insertion, both in SUMO's order, and (id, vType, route,
+        time to depart) of the vehicles yet to depart, taken from the
+        generated vehicles. Traffic lights are kept as (id, phase, time to
+        switch), since simulation time goes on across soft resets.
+        """
+        now = tc.simulation.getTime()
+        running = [(veh_id,
+                    tc.vehicle.getTypeID(veh_id),
+                    tc.vehicle.getRouteID(veh_id),
+                    tc.vehicle.getLaneID(veh_id),
+                    tc.vehicle.getLanePosition(veh_id),
+                    tc.vehicle.getSpeed(veh_id),
+                    tc.vehicle.getSpeedFactor(veh_id)) for veh_id in tc.vehicle.getIDList()]
+        pending = [(veh_id,
+                    tc.vehicle.getTypeID(veh_id),
+                    tc.vehicle.getRouteID(veh_id),
+                    tc.vehicle.getSpeedFactor(veh_id)) for veh_id in tc.simulation.getPendingVehicles()]
+        future = [(veh_id, vType, route, float(depart) - now) for veh_id, vType, route, depart in vehicles
+                  if float(depart) > now]
+        tls = [(tls_id,
+                tc.trafficlight.getPhase(tls_id),
+                tc.trafficlight.getNextSwitch(tls_id) - now) for tls_id in self._get_tls_ids(tc)]
+        return {"running": running, "pending": pending, "future": future, "tls": tls}
+
+    def _soft_reset(self, tc, state):
+        """Replaces all vehicles by the recorded fleet, keeping the network
+        loaded. Running vehicles are put back at their lane positions with
+        moveTo, pending ones are queued for insertion again, vehicles yet to
+        depart and traffic lights are rescheduled relative to the current
+        simulation time.
+        """
+        # Vehicles added by the last soft reset are only listed as pending
+        # after the next simulation step.
+        now = tc.simulation.getTime()
+        vehicles = set(tc.vehicle.getIDList()).union(tc.simulation.getPendingVehicles())
+        if self._current_t_steps == 0:
+            vehicles.update(self._soft_unlisted)
+        # Vehicles yet to depart are loaded but not listed by SUMO
+        vehicles.update(veh_id for veh_id, depart in self._soft_future if depart > now)
+        for veh_id in sorted(vehicles):
+            tc.vehicle.remove(veh_id)
+        for veh_id, vType, route, lane, pos, speed, speedFactor in state["running"]:
+            tc.vehicle.add(veh_id, route, typeID=vType, depart="now", departSpeed=repr(speed))
+            tc.vehicle.setSpeedFactor(veh_id, speedFactor)
+            tc.vehicle.moveTo(veh_id, lane, pos)
+        for veh_id, vType, route, speedFactor in state["pending"]:
+            tc.vehicle.add(veh_id, route, typeID=vType, depart="now")
+            tc.vehicle.setSpeedFactor(veh_id, speedFactor)
+        self._soft_unlisted = [veh_id for veh_id, _, _, _ in state["pending"]]
+        # Departures and traffic lights are timed from now
+        self._soft_future = []
+        for veh_id, vType, route, offset in state["future"]:
+            depart = round(now + offset, 3)
+            tc.vehicle.add(veh_id, route, typeID=vType, depart=repr(depart))
+            self._soft_future.append((veh_id, depart))
+        for tls_id, phase, remaining in state["tls"]:
+            tc.trafficlight.setPhase(tls_id, phase)
+            tc.trafficlight.setPhaseDuration(tls_id, remaining)
+
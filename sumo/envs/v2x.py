@@ -0,0 +1,195 @@
+import copy
+import collections
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+class V2XChannel:
+    """Periodic CAM style beacons between vehicles and roadside units.
+
+    Every vehicle broadcasts its position and speed every beacon_interval
+    seconds, with a random phase per vehicle and episode. A beacon reaches
+    a receiver within comm_range (rsu_range for links to or from a
+    roadside unit), is lost with probability packet_loss and is delivered
+    latency seconds after it was sent. Receivers keep the last state heard
+    from every sender and drop states older than max_age.
+
+    Roadside units sit at the junctions rsu_junctions. They receive vehicle
+    beacons like vehicles do and broadcast what they heard in their own
+    beacons, so vehicles also learn about senders out of their range.
+
+    Reachability of all senders and receivers of a step is computed in one
+    batch, over the senders within comm_range of the bounding box of the
+    receivers. Times are counted in simulation steps.
+    """
+
+    def __init__(self,
+                 comm_range: float=100.0,
+                 rsu_range: Optional[float]=None,
+                 packet_loss: float=0.0,
+                 latency: float=0.0,
+                 beacon_interval: float=0.1,
+                 max_age: float=1.0,
+                 rsu_junctions: Sequence[str]=("J8", "J11")):
+        if comm_range <= 0 or (rsu_range is not None and rsu_range <= 0):
+            raise ValueError("Communication range must be greater than zero.")
+        if packet_loss < 0 or packet_loss >= 1:
+            raise ValueError("Packet loss must be in [0, 1), Got: {}.".format(packet_loss))
+        if latency < 0 or beacon_interval <= 0 or max_age < 0:
+            raise ValueError("Latency, beacon interval and max age must not be negative.")
+        self._comm_range = comm_range
+        self._rsu_range = comm_range if rsu_range is None else rsu_range
+        self._packet_loss = packet_loss
+        self._latency = latency
+        self._beacon_interval = beacon_interval
+        self._max_age = max_age
+        self._rsu_junctions = tuple(rsu_junctions)
+        self._stats = collections.Counter()
+
+    @property
+    def rsu_junctions(self):
+        return self._rsu_junctions
+
+    @property
+    def comm_range(self):
+        return self._comm_range
+
+    def stats(self):
+        """Beacons sent, delivered and lost since construction."""
+        return dict(self._stats)
+
+    def get_state(self):
+        """Copy of the episode state, see V2I.fork. The random number
+        generator is the env's and restored by it."""
+        return copy.deepcopy({name: value for name, value in vars(self).items()
+                              if name not in ("_rng", "_stats")})
+
+    def set_state(self, state: dict):
+        vars(self).update(copy.deepcopy(state))
+
+    def reset(self, rsu_positions, num_receivers: int, t_step: float, np_random: np.random.Generator):
+        """Clears all state for a new episode with num_receivers vehicle
+        receivers. rsu_positions is an (num_rsus, 2) array."""
+        self._rng = np_random
+        self._period = max(1, int(round(self._beacon_interval / t_step)))
+        self._delay = int(round(self._latency / t_step))
+        self._max_age_steps = int(round(self._max_age / t_step))
+        self._rsu_positions = np.asarray(rsu_positions, dtype=np.float64).reshape(-1, 2)
+        self._num_receivers = num_receivers
+        self._num_nodes = num_receivers + len(self._rsu_positions)
+        self._rsu_phase = self._rng.integers(0, self._period, size=len(self._rsu_positions))
+
+        self._slots = {}
+        self._ids = []
+        self._last_step = None
+        self._last_ids = None
+        self._phase = None
+        self._reserve(64)
+        self._queue = collections.deque()
+
+    def _reserve(self, capacity: int):
+        """Grows the per sender arrays to capacity slots."""
+        phase = np.zeros(capacity, dtype=np.int64)
+        heard_at = np.full((self._num_nodes, capacity), -np.inf)
+        heard = np.zeros((self._num_nodes, capacity, 3), dtype=np.float64)
+        if self._phase is not None:
+            old = self._phase.shape[0]
+            phase[:old] = self._phase[:old]
+            heard_at[:, :old] = self._heard_at[:, :old]
+            heard[:, :old] = self._heard[:, :old]
+        self._phase, self._heard_at, self._heard = phase, heard_at, heard
+
+    def _get_slots(self, ids: Sequence[str]):
+        """Slots of the senders ids, new senders get a slot and a phase."""
+        # The set of vehicles rarely changes between steps
+        if self._last_ids is not None and ids == self._last_ids:
+            return self._last_slots
+        found = list(map(self._slots.get, ids))
+        for idx, slot in enumerate(found):
+            if slot is None:
+                slot = found[idx] = self._slots[ids[idx]] = len(self._ids)
+                self._ids.append(ids[idx])
+                if slot >= self._phase.shape[0]:
+                    self._reserve(2 * self._phase.shape[0])
+                self._phase[slot] = self._rng.integers(0, self._period)
+        self._last_ids = list(ids)
+        self._last_slots = np.array(found, dtype=np.int64)
+        return self._last_slots
+
+    def step(self, now: int, ids: Sequence[str], positions, speeds, receiver_ids: Sequence[str]):
+        """Sends the beacons due since the last call from the vehicles ids,
+        with (N, 2) positions and (N,) speeds at step now, and delivers the
+        ones due. The receivers are the vehicles receiver_ids, which must
+        be in ids."""
+        last = now - 1 if self._last_step is None else self._last_step
+        self._last_step = now
+        slots = self._get_slots(ids)
+        receivers = np.array([ids.index(veh_id) for veh_id in receiver_ids], dtype=np.int64)
+        nodes = np.concatenate([positions[receivers], self._rsu_positions])
+        node_slots = np.concatenate([slots[receivers], np.full(len(self._rsu_positions), -1)])
+        self._receiver_slots = node_slots[:self._num_receivers]
+
+        # Vehicle beacons, reachability of every due sender and node
+        phase = self._phase[slots]
+        due = np.flatnonzero((now - phase) // self._period > (last - phase) // self._period)
+        self._stats["sent"] += len(due)
+        if len(due):
+            lo = nodes.min(axis=0) - max(self._comm_range, self._rsu_range)
+            hi = nodes.max(axis=0) + max(self._comm_range, self._rsu_range)
+            due = due[np.all((positions[due] >= lo) & (positions[due] <= hi), axis=1)]
+        if len(due):
+            delta = positions[due][None, :, :] - nodes[:, None, :]
+            dist2 = np.einsum("rsk,rsk->rs", delta, delta)
+            ranges = np.full(self._num_nodes, self._comm_range)
+            ranges[self._num_receivers:] = self._rsu_range
+            reach = dist2 <= (ranges ** 2)[:, None]
+            reach &= node_slots[:, None] != slots[due][None, :]
+            lost = reach & (self._rng.random(reach.shape) < self._packet_loss)
+            self._stats["lost"] += int(np.count_nonzero(lost))
+            node, sender = np.nonzero(reach & ~lost)
+            states = np.column_stack([positions[due[sender]], speeds[due[sender]]])
+            self._queue.append((now + self._delay, "v2x", node, slots[due[sender]], states, now))
+
+        # Roadside unit beacons, relaying everything their unit heard
+        due_rsus = np.flatnonzero((now - self._rsu_phase) // self._period > (last - self._rsu_phase) // self._period)
+        if len(due_rsus) and self._num_receivers:
+            self._stats["sent"] += len(due_rsus)
+            delta = self._rsu_positions[due_rsus][None, :, :] - nodes[:self._num_receivers, None, :]
+            reach = np.einsum("rsk,rsk->rs", delta, delta) <= self._rsu_range ** 2
+            lost = reach & (self._rng.random(reach.shape) < self._packet_loss)
+            self._stats["lost"] += int(np.count_nonzero(lost))
+            node, rsu = np.nonzero(reach & ~lost)
+            if len(node):
+                rsu_nodes = self._num_receivers + due_rsus[rsu]
+                self._queue.append((now + self._delay, "relay", node,
+                                    self._heard_at[rsu_nodes].copy(), self._heard[rsu_nodes].copy(), now))
+
+        while self._queue and self._queue[0][0] <= now:
+            self._deliver(*self._queue.popleft()[1:])
+
+    def _deliver(self, kind, node, payload, states, sent_at):
+        """Stores delivered states, unless newer ones were heard already."""
+        self._stats["delivered"] += len(node)
+        if kind == "v2x":
+            newer = self._heard_at[node, payload] < sent_at
+            self._heard_at[node[newer], payload[newer]] = sent_at
+            self._heard[node[newer], payload[newer]] = states[newer]
+            return
+        for idx, receiver in enumerate(node):
+            width = payload.shape[1]
+            newer = payload[idx] > self._heard_at[receiver, :width]
+            self._heard_at[receiver, :width][newer] = payload[idx][newer]
+            self._heard[receiver, :width][newer] = states[idx][newer]
+
+    def received(self, receiver: int, now: int):
+        """Returns the ids, (k, 2) positions and (k,) speeds last heard by
+        the receiver-th receiver from other vehicles, of states at most
+        max_age old."""
+        heard_at = self._heard_at[receiver, :len(self._ids)]
+        fresh = heard_at >= now - self._max_age_steps
+        # Roadside units relay the receiver's own beacons as well
+        fresh[self._receiver_slots[receiver]] = False
+        fresh = np.flatnonzero(fresh)
+        states = self._heard[receiver, fresh]
+        return [self._ids[slot] for slot in fresh], states[:, :2], states[:, 2]
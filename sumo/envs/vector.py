@@ -0,0 +1,341 @@
+import sys
+import pickle
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from copy import deepcopy
+from typing import List, Optional, Union
+
+import numpy as np
+from gymnasium.vector import VectorEnv
+from gymnasium.vector.utils import concatenate, create_empty_array
+
+from sumo.envs.v2i import V2I
+
+# Single byte messages of the shared memory transport
+_STEP = b"s"
+_OK = b"\x01"
+
+
+class _SharedBuffers:
+    """NumPy arrays backed by multiprocessing.shared_memory blocks.
+
+    The parent creates the blocks from a {name: (shape, dtype)} spec and
+    passes `spec()` to the workers, which attach to the same blocks. Every
+    worker only reads and writes the rows of its own sub-env.
+    """
+
+    def __init__(self, layout: dict, create: bool=True):
+        self._blocks = {}
+        self._layout = {}
+        for name, (shm_name, shape, dtype) in layout.items():
+            dtype = np.dtype(dtype)
+            size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+            block = shared_memory.SharedMemory(name=shm_name, create=create, size=size)
+            self._blocks[name] = block
+            self._layout[name] = (block.name, shape, dtype.str)
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+
+    @classmethod
+    def create(cls, arrays: dict):
+        return cls({name: (None, shape, dtype) for name, (shape, dtype) in arrays.items()})
+
+    def spec(self):
+        return dict(self._layout)
+
+    def close(self, unlink: bool=False):
+        for name, block in self._blocks.items():
+            # Views must be released before the block can be closed
+            delattr(self, name)
+            try:
+                block.close()
+            except BufferError:
+                # Views handed out without copy are still alive
+                pass
+            if unlink:
+                block.unlink()
+        self._blocks = {}
+
+
+def _shared_step(env, index: int, shared: _SharedBuffers):
+    """Steps env with its action from shared memory and writes the results
+    back, resetting the env when the episode ends.
+
+    Returns the info entries without a shared buffer, such as "profile",
+    as {"info": ..., "final_info": ...}, empty when there are none.
+    """
+    observation, reward, terminated, truncated, info = env.step(shared.actions[index])
+    done = terminated or truncated
+    shared.has_final[index] = done
+    extra = {}
+    if done:
+        final_info = dict(info)
+        shared.final_observations[index] = observation
+        shared.final_nearby[index] = final_info.pop("num_vehicles_nearby", -1)
+        shared.final_collided[index] = final_info.pop("collided", -1)
+        if final_info:
+            extra["final_info"] = final_info
+        observation, info = env.reset()
+    shared.observations[index] = observation
+    shared.rewards[index] = reward
+    shared.terminateds[index] = terminated
+    shared.truncateds[index] = truncated
+    info = dict(info)
+    shared.nearby[index] = info.pop("num_vehicles_nearby")
+    if info:
+        extra["info"] = info
+    return extra
+
+
+def _worker(index: int, env_kwargs: dict, pipe, parent_pipe, error_queue, shared_spec: Optional[dict]=None):
+    """Runs one V2I with its own labelled TraCI connection and serves
+    commands received from the parent process.
+
+    With shared memory, steps are requested by a single byte and results
+    are written into the shared buffers, other commands are pickled.
+    """
+    env = V2I(label="worker-{}".format(index), **env_kwargs)
+    shared = _SharedBuffers(shared_spec, create=False) if shared_spec is not None else None
+    parent_pipe.close()
+    try:
+        while True:
+            if shared is None:
+                command, data = pipe.recv()
+            else:
+                message = pipe.recv_bytes()
+                if message == _STEP:
+                    extra = _shared_step(env, index, shared)
+                    # Info entries without a shared buffer are pickled
+                    pipe.send_bytes(pickle.dumps(extra) if extra else _OK)
+                    continue
+                command, data = pickle.loads(message)
+
+            if command == "reset":
+                observation, info = env.reset(**data)
+                if shared is not None:
+                    shared.observations[index] = observation
+                    observation = None
+                pipe.send(((observation, info), True))
+            elif command == "step":
+                observation, reward, terminated, truncated, info = env.step(data)
+                # Finished sub-envs are reset right away, the last
+                # observation and info are handed back in info.
+                if terminated or truncated:
+                    old_observation, old_info = observation, info
+                    observation, info = env.reset()
+                    info["final_observation"] = old_observation
+                    info["final_info"] = old_info
+                pipe.send(((observation, reward, terminated, truncated, info), True))
+            elif command == "call":
+                name, args, kwargs = data
+                attr = getattr(env, name)
+                pipe.send((attr(*args, **kwargs) if callable(attr) else attr, True))
+            elif command == "close":
+                pipe.send((None, True))
+                break
+            else:
+                raise RuntimeError("Received unknown command: {}.".format(command))
+    except (KeyboardInterrupt, Exception):
+        error_queue.put((index,) + sys.exc_info()[:2])
+        pipe.send((None, False))
+    finally:
+        env.close()
+        if shared is not None:
+            shared.close()
+
+
+class V2IVectorEnv(VectorEnv):
+    """Runs num_envs V2I environments in worker processes.
+
+    Every worker drives its own SUMO instance through a labelled TraCI
+    connection, so steps of all sub-envs run in parallel. Sub-envs are
+    reset automatically when they terminate or truncate, the final
+    observation and info are then found under "final_observation" and
+    "final_info" in info, as with gymnasium's vector envs.
+
+    With shared_memory, observations, rewards, done flags and actions of
+    all sub-envs live in multiprocessing.shared_memory buffers, written by
+    the workers in place; a step only sends one byte through each pipe,
+    unless infos hold entries without a shared buffer, like "profile".
+    Infos hold the same entries with both transports. Without copy, step and reset return views of these buffers,
+    which are overwritten by the next call.
+
+    Keyword arguments other than num_envs, context, shared_memory and copy
+    are passed to V2I.
+    """
+
+    def __init__(self,
+                 num_envs: int,
+                 context: Optional[str]=None,
+                 shared_memory: bool=False,
+                 copy: bool=True,
+                 **env_kwargs):
+        if num_envs < 1:
+            raise ValueError("Number of envs must be greater than zero.")
+
+        # Spaces are read from a V2I which never starts SUMO
+        dummy_env = V2I(**env_kwargs)
+        super().__init__(num_envs=num_envs,
+                         observation_space=dummy_env.observation_space,
+                         action_space=dummy_env.action_space)
+        del dummy_env
+
+        self.copy = copy
+        self._shared = None
+        if shared_memory:
+            obs_space, act_space = self.single_observation_space, self.single_action_space
+            self._shared = _SharedBuffers.create({
+                "observations": ((num_envs,) + obs_space.shape, obs_space.dtype),
+                "final_observations": ((num_envs,) + obs_space.shape, obs_space.dtype),
+                "actions": ((num_envs,) + act_space.shape, act_space.dtype),
+                "rewards": ((num_envs,), np.float64),
+                "terminateds": ((num_envs,), np.bool_),
+                "truncateds": ((num_envs,), np.bool_),
+                "has_final": ((num_envs,), np.bool_),
+                "nearby": ((num_envs,), np.int64),
+                "final_nearby": ((num_envs,), np.int64),
+                "final_collided": ((num_envs,), np.int8),
+            })
+        shared_spec = self._shared.spec() if self._shared is not None else None
+
+        ctx = mp.get_context(context)
+        self.parent_pipes, self.processes = [], []
+        self.error_queue = ctx.Queue()
+        for index in range(num_envs):
+            parent_pipe, child_pipe = ctx.Pipe()
+            process = ctx.Process(target=_worker,
+                                  name="V2IVectorEnvWorker-{}".format(index),
+                                  args=(index, env_kwargs, child_pipe, parent_pipe, self.error_queue, shared_spec),
+                                  daemon=True)
+            self.parent_pipes.append(parent_pipe)
+            self.processes.append(process)
+            process.start()
+            child_pipe.close()
+
+        if self._shared is not None:
+            self._observations = self._shared.observations
+        else:
+            self._observations = create_empty_array(self.single_observation_space,
+                                                    n=self.num_envs,
+                                                    fn=np.zeros)
+
+    def reset_async(self,
+                    seed: Optional[Union[int, List[int]]]=None,
+                    options: Optional[dict]=None):
+        if seed is None:
+            seed = [None] * self.num_envs
+        elif isinstance(seed, int):
+            seed = [seed + i for i in range(self.num_envs)]
+        assert len(seed) == self.num_envs
+
+        for pipe, single_seed in zip(self.parent_pipes, seed):
+            self._send(pipe, ("reset", {"seed": single_seed, "options": options}))
+
+    def reset_wait(self,
+                   seed: Optional[Union[int, List[int]]]=None,
+                   options: Optional[dict]=None):
+        results, successes = zip(*[pipe.recv() for pipe in self.parent_pipes])
+        self._raise_if_errors(successes)
+
+        infos = {}
+        observations, info_data = zip(*results)
+        for index, info in enumerate(info_data):
+            infos = self._add_info(infos, info, index)
+        if self._shared is None:
+            concatenate(self.single_observation_space, observations, self._observations)
+        return deepcopy(self._observations) if self.copy else self._observations, infos
+
+    def step_async(self, actions):
+        if self._shared is not None:
+            self._shared.actions[:] = np.asarray(actions).reshape(self._shared.actions.shape)
+            for pipe in self.parent_pipes:
+                pipe.send_bytes(_STEP)
+            return
+        for pipe, action in zip(self.parent_pipes, actions):
+            pipe.send(("step", action))
+
+    def step_wait(self):
+        if self._shared is not None:
+            return self._shared_step_wait()
+
+        results, successes = zip(*[pipe.recv() for pipe in self.parent_pipes])
+        self._raise_if_errors(successes)
+
+        observations, rewards, terminateds, truncateds, infos = [], [], [], [], {}
+        for index, (observation, reward, terminated, truncated, info) in enumerate(results):
+            observations.append(observation)
+            rewards.append(reward)
+            terminateds.append(terminated)
+            truncateds.append(truncated)
+            infos = self._add_info(infos, info, index)
+        concatenate(self.single_observation_space, observations, self._observations)
+
+        return (deepcopy(self._observations) if self.copy else self._observations,
+                np.array(rewards, dtype=np.float64),
+                np.array(terminateds, dtype=np.bool_),
+                np.array(truncateds, dtype=np.bool_),
+                infos)
+
+    def _shared_step_wait(self):
+        messages = [pipe.recv_bytes() for pipe in self.parent_pipes]
+        # Failed workers send a pickled (None, False)
+        extras = [{} if message == _OK else pickle.loads(message) for message in messages]
+        self._raise_if_errors([isinstance(extra, dict) for extra in extras])
+
+        shared = self._shared
+        infos = {"num_vehicles_nearby": shared.nearby.copy(),
+                 "_num_vehicles_nearby": np.ones(self.num_envs, dtype=np.bool_)}
+        for index, extra in enumerate(extras):
+            if "info" in extra:
+                infos = self._add_info(infos, extra["info"], index)
+        for index in np.flatnonzero(shared.has_final):
+            # Terminal infos hold "collided" instead of "num_vehicles_nearby"
+            final_info = {}
+            if shared.final_nearby[index] >= 0:
+                final_info["num_vehicles_nearby"] = int(shared.final_nearby[index])
+            if shared.final_collided[index] >= 0:
+                final_info["collided"] = bool(shared.final_collided[index])
+            final_info.update(extras[index].get("final_info", {}))
+            infos = self._add_info(infos, {"final_observation": shared.final_observations[index].copy(),
+                                           "final_info": final_info}, index)
+        if self.copy:
+            return (shared.observations.copy(), shared.rewards.copy(),
+                    shared.terminateds.copy(), shared.truncateds.copy(), infos)
+        return shared.observations, shared.rewards, shared.terminateds, shared.truncateds, infos
+
+    def call(self, name: str, *args, **kwargs):
+        """Calls a method, or reads an attribute, of every sub-env."""
+        for pipe in self.parent_pipes:
+            self._send(pipe, ("call", (name, args, kwargs)))
+        results, successes = zip(*[pipe.recv() for pipe in self.parent_pipes])
+        self._raise_if_errors(successes)
+        return results
+
+    def close_extras(self, **kwargs):
+        for pipe, process in zip(self.parent_pipes, self.processes):
+            if process.is_alive():
+                try:
+                    self._send(pipe, ("close", None))
+                    pipe.recv()
+                except (BrokenPipeError, EOFError):
+                    pass
+        for pipe, process in zip(self.parent_pipes, self.processes):
+            pipe.close()
+            process.join()
+        if self._shared is not None:
+            self._observations = None
+            self._shared.close(unlink=True)
+            self._shared = None
+
+    def _send(self, pipe, message):
+        """Sends a pickled command, workers of the shared memory transport
+        receive raw bytes."""
+        if self._shared is not None:
+            pipe.send_bytes(pickle.dumps(message))
+        else:
+            pipe.send(message)
+
+    def _raise_if_errors(self, successes):
+        if all(successes):
+            return
+        index, exctype, value = self.error_queue.get()
+        raise exctype("Received the following error from worker {}: {}".format(index, value))